@@ -0,0 +1,21 @@
+"""Shared setup of the benchmark scripts.
+
+Importing this module makes the hippolink package in src importable
+without installing it.
+"""
+import os
+import sys
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "src"))
+
+
+class Sink(object):
+    '''Port that collects everything written to it in data.'''
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Compare the slice based COBS implementation against the previous
+byte-by-byte implementation."""
+import timeit
+
+import _common  # noqa: F401
+from hippolink import cobs
+
+
+def legacy_encode(data):
+    output = bytearray(len(data) + 2)
+    dst_index = 1
+    zero_offset = 1
+    for src_byte in data:
+        if src_byte == 0:
+            output[dst_index - zero_offset] = zero_offset
+            zero_offset = 1
+        else:
+            output[dst_index] = src_byte
+            zero_offset += 1
+        dst_index += 1
+    output[dst_index - zero_offset] = zero_offset
+    output[dst_index] = 0
+    return output
+
+
+def legacy_decode(data):
+    if data[-1] == 0:
+        data = data[:-1]
+    output = bytearray()
+    index = 1
+    offset = data[0] - 1
+    while index < len(data):
+        if offset == 0:
+            output.append(0)
+            offset = data[index]
+        else:
+            output.append(data[index])
+        index += 1
+        offset -= 1
+    return output
+
+
+def make_payload(size, zero_every):
+    data = bytearray((i % 255) + 1 for i in range(size))
+    if zero_every:
+        for i in range(0, size, zero_every):
+            data[i] = 0
+    return bytes(data)
+
+
+def throughput(func, data, number):
+    seconds = min(timeit.repeat(lambda: func(data), number=number, repeat=3))
+    return len(data) * number / seconds / 1e6
+
+
+def main():
+    # legacy encoder cannot emit 0xFF blocks, so keep runs below 254 bytes
+    cases = [(16, 0), (33, 8), (128, 32), (253, 0), (1024, 64)]
+    print("{:>6} {:>6} | {:>10} {:>10} | {:>10} {:>10}".format(
+        "size", "zeros", "enc old", "enc new", "dec old", "dec new"))
+    for size, zero_every in cases:
+        data = make_payload(size, zero_every)
+        encoded = bytes(cobs.encode(data))
+        assert bytes(legacy_encode(data)) == encoded
+        assert bytes(legacy_decode(encoded)) == data
+        number = max(200, 200000 // size)
+        print("{:>6} {:>6} | {:>10.2f} {:>10.2f} | {:>10.2f} {:>10.2f} "
+              "MB/s".format(size, zero_every or "-",
+                            throughput(legacy_encode, data, number),
+                            throughput(cobs.encode, data, number),
+                            throughput(legacy_decode, encoded, number),
+                            throughput(cobs.decode, encoded, number)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Bandwidth and CPU cost of delta compression on a synthetic trajectory.
+
+A vehicle drives a circle with some noise and streams POSE, POSE_2D_MIN and
+PATH_TARGET at the same rate. For every message type the encoded bytes on
+the wire and the send/receive time per message are compared with and
+without compression, followed by the messages lost to 1% frame loss.
+"""
+import math
+import random
+import timeit
+
+import _common
+from hippolink import msgs
+from hippolink.delta import DeltaCompression
+from hippolink.hippolink import HippoLink
+from hippolink.hippolink import HippoLink_bad_data
+
+N_SAMPLES = 5000
+RATE = 100.0
+LOSS = 0.01
+MSG_TYPES = (msgs.HippoLink_pose_message, msgs.HippoLink_pose_2d_min_message,
+             msgs.HippoLink_path_target_message)
+
+
+def trajectory(msg_type, n=N_SAMPLES):
+    rng = random.Random(1)
+    samples = []
+    for i in range(n):
+        t = i / RATE
+        yaw = 0.2 * t
+        x = 20.0 * math.cos(yaw) + rng.gauss(0, 0.002)
+        y = 20.0 * math.sin(yaw) + rng.gauss(0, 0.002)
+        z = -1.5 + 0.1 * math.sin(t) + rng.gauss(0, 0.001)
+        if msg_type is msgs.HippoLink_pose_message:
+            samples.append(
+                msg_type(x, y, z, 0.0, 0.0, math.sin(yaw / 2),
+                         math.cos(yaw / 2)))
+        elif msg_type is msgs.HippoLink_pose_2d_min_message:
+            samples.append(
+                msg_type(int(x * 1000), int(y * 1000),
+                         int(yaw * 1000) % 6283))
+        else:
+            samples.append(msg_type(x + 1.0, y, z, i // 200))
+    return samples
+
+
+def send(samples, compression):
+    link = HippoLink(_common.Sink(), node_id=1)
+    link.set_delta_compression(compression)
+    for msg in samples:
+        link.send(msg)
+    return bytes(link.port.data)
+
+
+def receive(stream, compressed):
+    link = HippoLink(None, node_id=2)
+    if compressed:
+        link.set_delta_compression(DeltaCompression())
+    return link.feed(stream)
+
+
+def lost(stream, compressed):
+    rng = random.Random(2)
+    frames = [frame for frame in stream.split(b"\x00")[:-1]
+              if rng.random() >= LOSS]
+    received = receive(b"\x00".join(frames) + b"\x00", compressed)
+    return N_SAMPLES - sum(not isinstance(msg, HippoLink_bad_data)
+                           for msg in received)
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=3)) / N_SAMPLES * 1e6
+
+
+def main():
+    print("{:<20} {:<10} {:>8} {:>8} {:>9} {:>9} {:>6}".format(
+        "message", "mode", "B/msg", "ratio", "send us", "recv us", "lost"))
+    for msg_type in MSG_TYPES:
+        samples = trajectory(msg_type)
+        plain = send(samples, None)
+        modes = [("plain", None)]
+        for reference in ("previous", "keyframe"):
+            modes.append((reference, lambda reference=reference:
+                          DeltaCompression(MSG_TYPES, reference=reference)))
+        for label, factory in modes:
+            stream = send(samples, factory and factory())
+            compressed = factory is not None
+            send_us = best(lambda: send(samples, factory and factory()))
+            recv_us = best(lambda: receive(stream, compressed))
+            print("{:<20} {:<10} {:>8.1f} {:>8.2f} {:>9.2f} {:>9.2f} "
+                  "{:>6}".format(msg_type.name, label,
+                                 len(stream) / N_SAMPLES,
+                                 len(stream) / len(plain), send_us,
+                                 recv_us, lost(stream, compressed)))
+
+
+if __name__ == "__main__":
+    main()
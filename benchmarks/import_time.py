@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Measure the import time of the generated messages and the link.
+
+Every run starts a fresh interpreter. Pass --src to measure another checkout
+(e.g. before a change); its msgs.py has to be generated already.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                   "src")
+
+# prints the cumulative seconds after each stage
+CHILD = """
+import sys
+import time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import hippolink.msgs as msgs
+print("import msgs", time.perf_counter() - start)
+msgs.HIPPOLINK_MAP[min(msgs.HIPPOLINK_MAP)]
+print("first message", time.perf_counter() - start)
+for msg_id in list(msgs.HIPPOLINK_MAP):
+    msgs.HIPPOLINK_MAP[msg_id].unpacker.size
+print("all messages", time.perf_counter() - start)
+import hippolink.hippolink
+print("import hippolink.hippolink", time.perf_counter() - start)
+"""
+
+
+def run_once(src):
+    output = subprocess.check_output(
+        [sys.executable, "-c", CHILD.format(src=src)],
+        universal_newlines=True)
+    stages = []
+    for line in output.splitlines():
+        name, seconds = line.rsplit(" ", 1)
+        stages.append((name, float(seconds)))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--src", default=SRC,
+                        help="directory containing the hippolink package")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    samples = {}
+    names = []
+    for _ in range(args.runs):
+        for name, seconds in run_once(args.src):
+            if name not in samples:
+                names.append(name)
+                samples[name] = []
+            samples[name].append(seconds)
+    print("cumulative time since start, {} runs".format(args.runs))
+    for name in names:
+        print("{:<28} median {:>7.2f} ms  min {:>7.2f} ms".format(
+            name, statistics.median(samples[name]) * 1e3,
+            min(samples[name]) * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""Measure the memory retained per decoded message for every message type."""
+import tracemalloc
+
+import _common
+from hippolink import cobs
+from hippolink import msgs
+from hippolink.hippolink import HippoLink
+
+N_MESSAGES = 10000
+
+
+def sample_message(msg_type):
+    # non-zero values so no payload bytes get truncated
+    args = [i + 1 for i in range(len(msg_type.fieldnames))]
+    return msg_type(*args)
+
+
+def bytes_per_message(msg_type, keep_buffers):
+    sender = HippoLink(_common.Sink(), node_id=1)
+    sender.send(sample_message(msg_type))
+    frame = bytes(cobs.decode(sender.port.data))
+    link = HippoLink(None, node_id=2, keep_buffers=keep_buffers)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [link.decode(bytearray(frame)) for _ in range(N_MESSAGES)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / float(N_MESSAGES)
+
+
+def main():
+    print("{:<24} {:>8} {:>14} {:>14}".format("message", "payload",
+                                              "with buffers", "no buffers"))
+    for msg_id in sorted(msgs.HIPPOLINK_MAP):
+        msg_type = msgs.HIPPOLINK_MAP[msg_id]
+        print("{:<24} {:>8} {:>12.1f} B {:>12.1f} B".format(
+            msg_type.name, msg_type.unpacker.size,
+            bytes_per_message(msg_type, True),
+            bytes_per_message(msg_type, False)))
+
+
+if __name__ == "__main__":
+    main()
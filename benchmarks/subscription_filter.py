@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Compare receiving a mixed stream with and without subscription filtering.
+
+Only POSE messages are subscribed, the other message types are dropped
+after COBS decoding.
+"""
+import timeit
+
+import _common
+from hippolink import msgs
+from hippolink.hippolink import HippoLink
+
+N_ROUNDS = 2000
+
+
+def mixed_stream():
+    sender = HippoLink(_common.Sink(), node_id=1)
+    for i in range(N_ROUNDS):
+        sender.send(msgs.HippoLink_pose_message(i, 1.0, 2.0, 0.1, 0.2, 0.3,
+                                                0.9))
+        sender.send(msgs.HippoLink_radio_rssi_report_message(2, 100, 20))
+        sender.send(msgs.HippoLink_path_target_message(1.0, 2.0, 3.0, i))
+        sender.send(msgs.HippoLink_pose_2d_min_message(10, 20, 30))
+        sender.send(msgs.HippoLink_path_target_2d_min_message(10, 20, i))
+    return bytes(sender.port.data)
+
+
+def receive(stream, subscribe, verify_crc=False):
+    link = HippoLink(None, node_id=2)
+    received = []
+    if subscribe:
+        link.subscribe(msgs.HippoLink_pose_message, received.append)
+        link.verify_filtered_crc = verify_crc
+    link.feed(stream)
+    return link
+
+
+def main():
+    stream = mixed_stream()
+    n_frames = N_ROUNDS * 5
+    cases = [("no subscription", False, False),
+             ("subscribe POSE", True, False),
+             ("subscribe POSE, verify CRC", True, True)]
+    for label, subscribe, verify_crc in cases:
+        seconds = min(
+            timeit.repeat(lambda: receive(stream, subscribe, verify_crc),
+                          number=1,
+                          repeat=5))
+        print("{:<28} {:>10.0f} frames/s".format(label, n_frames / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""Benchmark suite for COBS, CRC, pack, decode and end-to-end loopback.
+
+Results are printed and can be written to a JSON file with --output. Pass
+a previous result file with --compare to print the speedup of each case.
+
+Per case the suite reports operations (messages) per second, MB/s of the
+processed bytes and retained_blocks_per_op, the number of memory blocks
+allocated per operation that are still alive afterwards while the results
+of the operations are kept (i.e. what a decoded or packed message costs in
+objects). Temporary allocations freed within an operation are not counted.
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import _common  # noqa: F401
+from hippolink import cobs
+from hippolink import crc
+from hippolink import msgs
+from hippolink.hippolink import HippoLink
+
+BUFFER_SIZES = (16, 64, 256, 1024)
+BLOCKS_SAMPLE = 1000
+
+
+class MemoryPort(object):
+    '''In-memory stand-in for a serial port.'''
+    def __init__(self, data=b""):
+        self.data = bytearray(data)
+        self.read_index = 0
+
+    def write(self, data):
+        self.data += data
+
+    def read_until(self, expected=b"\x00"):
+        end = self.data.find(expected, self.read_index)
+        if end < 0:
+            end = len(self.data) - 1
+        start = self.read_index
+        self.read_index = end + 1
+        return bytes(self.data[start:end + 1])
+
+    def rewind(self):
+        self.read_index = 0
+
+
+def sample_messages(zero_tail):
+    '''one message per type, with all trailing fields zero if zero_tail'''
+    messages = []
+    for msg_id in sorted(msgs.HIPPOLINK_MAP):
+        msg_type = msgs.HIPPOLINK_MAP[msg_id]
+        args = []
+        for name in msg_type.fieldnames:
+            # only the first field on the wire is non-zero for zero_tail
+            if zero_tail and name != msg_type.ordered_fieldnames[0]:
+                args.append(0)
+            else:
+                args.append(msg_type.fieldnames.index(name) + 3)
+        messages.append(msg_type(*args))
+    return messages
+
+
+def payload(size):
+    # mixed data with a zero every 16 bytes
+    return bytes(0 if i % 16 == 0 else (i % 255) + 1 for i in range(size))
+
+
+def retained_blocks_per_op(func):
+    results = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(BLOCKS_SAMPLE):
+        results.append(func())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # the list itself holds on to a few blocks
+    blocks = sum(stat.count_diff
+                 for stat in after.compare_to(before, "filename"))
+    return max(0.0, blocks / float(BLOCKS_SAMPLE))
+
+
+def measure(name, func, n_bytes, ops_per_call=1, quick=False, **params):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    repeat = 2 if quick else 5
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+    ops = ops_per_call / seconds
+    return dict(name=name,
+                params=params,
+                ops_per_s=ops,
+                mb_per_s=n_bytes / seconds / 1e6,
+                retained_blocks_per_op=retained_blocks_per_op(func) /
+                ops_per_call)
+
+
+def bench_cobs(quick):
+    for size in BUFFER_SIZES:
+        data = payload(size)
+        encoded = bytes(cobs.encode(data))
+        out = bytearray(cobs.max_encoded_len(size))
+        yield measure("cobs.encode", lambda: cobs.encode(data), size,
+                      quick=quick, size=size)
+        yield measure("cobs.encode_into", lambda: cobs.encode_into(data, out),
+                      size, quick=quick, size=size)
+        yield measure("cobs.decode", lambda: cobs.decode(encoded), size,
+                      quick=quick, size=size)
+        yield measure("cobs.decode_into",
+                      lambda: cobs.decode_into(encoded, out), size,
+                      quick=quick, size=size)
+
+
+def bench_crc(quick):
+    for size in BUFFER_SIZES:
+        data = payload(size)
+        yield measure("x25crc", lambda: crc.x25crc(data).crc, size,
+                      quick=quick, size=size)
+        yield measure("crc16", lambda: crc.crc16(data, 42), size,
+                      quick=quick, size=size)
+    frames = [payload(32) for _ in range(100)]
+    extras = [42] * len(frames)
+    yield measure("crc.check_many", lambda: crc.check_many(frames, extras),
+                  32 * len(frames), ops_per_call=len(frames), quick=quick,
+                  size=32)
+
+
+class _Node(object):
+    node_id = 1
+
+
+def bench_pack(quick):
+    buffer = bytearray(msgs.MAX_FRAME_LEN)
+    for zero_tail in (False, True):
+        for msg in sample_messages(zero_tail):
+            frame_len = len(msg.pack(_Node))
+            yield measure("pack", lambda: msg.pack(_Node), frame_len,
+                          quick=quick, msg=msg.name, zero_tail=zero_tail)
+            yield measure("pack_into",
+                          lambda: msg.pack_into(buffer, 0, 1), frame_len,
+                          quick=quick, msg=msg.name, zero_tail=zero_tail)
+
+
+def bench_decode(quick):
+    link = HippoLink(None, 1)
+    modes = [("eager", HippoLink(None, 1)),
+             ("zero_copy", HippoLink(None, 1, zero_copy=True)),
+             ("lazy", HippoLink(None, 1, lazy=True))]
+    for zero_tail in (False, True):
+        for msg in sample_messages(zero_tail):
+            frame = bytearray(msg.pack(link))
+            for mode, decoder in modes:
+                yield measure("HippoLink.decode",
+                              lambda: decoder.decode(frame), len(frame),
+                              quick=quick, msg=msg.name, zero_tail=zero_tail,
+                              mode=mode)
+            target = link.decode(frame)
+            yield measure("HippoLink.decode_into",
+                          lambda: link.decode_into(frame, target), len(frame),
+                          quick=quick, msg=msg.name, zero_tail=zero_tail)
+
+
+def bench_loopback(quick):
+    n_rounds = 20
+    for zero_tail in (False, True):
+        messages = sample_messages(zero_tail) * n_rounds
+        stream = MemoryPort()
+        HippoLink(stream, 1).send_many(messages)
+        n_bytes = len(stream.data)
+
+        def send():
+            sender = HippoLink(MemoryPort(), 1)
+            for msg in messages:
+                sender.send(msg)
+            return sender
+
+        def feed():
+            return HippoLink(None, 2).feed(stream.data)
+
+        def recv_msg():
+            stream.rewind()
+            receiver = HippoLink(stream, 2)
+            return [receiver.recv_msg() for _ in messages]
+
+        def send_and_feed():
+            port = MemoryPort()
+            sender = HippoLink(port, 1)
+            for msg in messages:
+                sender.send(msg)
+            return HippoLink(None, 2).feed(port.data)
+
+        for name, func in (("loopback.send", send), ("loopback.feed", feed),
+                           ("loopback.recv_msg", recv_msg),
+                           ("loopback.send_feed", send_and_feed)):
+            yield measure(name, func, n_bytes, ops_per_call=len(messages),
+                          quick=quick, zero_tail=zero_tail)
+
+
+GROUPS = dict(cobs=bench_cobs,
+              crc=bench_crc,
+              pack=bench_pack,
+              decode=bench_decode,
+              loopback=bench_loopback)
+
+
+def case_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def format_params(params):
+    return ", ".join("{}={}".format(key, params[key])
+                     for key in sorted(params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer repetitions")
+    parser.add_argument("groups", nargs="*", choices=[[]] + sorted(GROUPS),
+                        help="benchmark groups to run (default: all)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = dict((case_key(r), r) for r in json.load(f)["results"])
+
+    results = []
+    for group in args.groups or sorted(GROUPS):
+        for result in GROUPS[group](args.quick):
+            results.append(result)
+            line = ("{:<22} {:<50} {:>10.0f} op/s {:>8.2f} MB/s "
+                    "{:>5.1f} blk kept").format(
+                result["name"], format_params(result["params"]),
+                result["ops_per_s"], result["mb_per_s"],
+                result["retained_blocks_per_op"])
+            old = baseline.get(case_key(result))
+            if old is not None:
+                line += " {:>6.2f}x".format(
+                    result["ops_per_s"] / old["ops_per_s"])
+            print(line)
+
+    if args.output:
+        report = dict(meta=dict(
+            python=sys.version,
+            implementation=platform.python_implementation(),
+            platform=platform.platform(),
+            date=datetime.datetime.now().isoformat()),
+                      results=results)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
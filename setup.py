@@ -33,13 +33,16 @@ setup(
     version="0.1",
     license="MIT",
     package_dir={"": "src"},
-    packages=["hippolink", "hippolink.generation"],
+    packages=["hippolink", "hippolink.generation", "hippolink.dialects"],
     package_data={"hippolink": ["*.xml"]},
     # scripts=["scripts/hippogen.py"],
     install_requires=[
         "future",
         "pyserial"
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     setup_requires=[
         "yapf",
     ],
@@ -0,0 +1,92 @@
+import asyncio
+import collections
+import os
+
+from .hippolink import HippoLink
+
+
+class AsyncHippoLink(object):
+    '''HippoLink on top of an asyncio StreamReader/StreamWriter pair.
+
+    Packing, decoding, link stats, callbacks and logging are done by a
+    regular HippoLink instance (self.link) which uses the writer as port.
+    '''
+    def __init__(self, reader, writer, node_id, read_size=4096, **kwargs):
+        self.reader = reader
+        self.writer = writer
+        self.read_size = read_size
+        self.link = HippoLink(writer, node_id, **kwargs)
+        self._pending = collections.deque()
+
+    @classmethod
+    async def open_connection(cls, node_id, host=None, port=None,
+                              read_size=4096, link_kwargs=None, **kwargs):
+        '''Connect via asyncio.open_connection, e.g. with sock=...
+
+        kwargs go to asyncio.open_connection, link_kwargs (a dict) to the
+        HippoLink, e.g. dict(lazy=True).
+        '''
+        reader, writer = await asyncio.open_connection(host, port, **kwargs)
+        return cls(reader, writer, node_id, read_size, **(link_kwargs or {}))
+
+    @classmethod
+    async def open_fd(cls, fd, node_id, **kwargs):
+        '''Use an already opened and configured file descriptor.
+
+        Works for serial devices, ptys and pipes. fd is duplicated, the
+        caller keeps ownership of the original descriptor.
+        '''
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        read_file = os.fdopen(os.dup(fd), "rb", buffering=0)
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), read_file)
+        write_file = os.fdopen(os.dup(fd), "wb", buffering=0)
+        transport, protocol = await loop.connect_write_pipe(
+            lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()),
+            write_file)
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        return cls(reader, writer, node_id, **kwargs)
+
+    @property
+    def link_stats(self):
+        return self.link.link_stats
+
+    async def recv(self):
+        '''Next received message or None once the stream has ended.'''
+        while not self._pending:
+            data = await self.reader.read(self.read_size)
+            if not data:
+                return None
+            self._pending.extend(self.link.feed(data))
+        return self._pending.popleft()
+
+    async def send(self, msg):
+        '''Send msg and wait until the write buffer has drained.'''
+        self.link.send(msg)
+        await self.writer.drain()
+
+    async def send_many(self, msgs):
+        '''Send msgs with a single write and wait for the buffer to drain.'''
+        self.link.send_many(msgs)
+        await self.writer.drain()
+
+    async def flush(self):
+        self.link.flush()
+        await self.writer.drain()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.recv()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
@@ -0,0 +1,94 @@
+# Columnar decoding of many frames into one numpy structured array per
+# message type. numpy is an optional dependency and only needed here, it is
+# imported on first use to keep it out of the package import time.
+import struct
+
+from . import msgs
+from .crc import check_many
+from .stats import ERROR_CRC, ERROR_LENGTH, ERROR_UNKNOWN_ID
+
+HEADER_LEN = 3
+CRC_LEN = 2
+# columns in front of the payload fields of every record
+RECORD_HEADER_DESCR = [("rx_index", "<i8"), ("node_id", "u1")]
+_record_header = struct.Struct("<qB")
+_dtypes = {}
+np = None
+
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Batch decoding requires numpy.")
+        np = numpy
+
+
+def message_dtype(msg_type):
+    '''structured dtype of the records decode_batch returns for msg_type'''
+    _require_numpy()
+    dtype = _dtypes.get(msg_type.id)
+    if dtype is None:
+        dtype = np.dtype(RECORD_HEADER_DESCR + msg_type.dtype_descr)
+        _dtypes[msg_type.id] = dtype
+    return dtype
+
+
+def decode_batch(frames, link=None):
+    '''decode COBS-decoded frames into one structured array per msg_id.
+
+    Returns a dict mapping msg_id to an array with the rx_index (position
+    of the frame in frames) and node_id columns followed by the payload
+    fields. Frames with invalid length, unknown msg_id or bad CRC are
+    skipped. If link is given, its link stats are updated.
+    '''
+    _require_numpy()
+    groups = {}
+    decoders = msgs.HIPPOLINK_DECODERS
+    for index, frame in enumerate(frames):
+        frame_len = len(frame)
+        cause = None
+        if (frame_len < HEADER_LEN + CRC_LEN
+                or frame[0] != frame_len - HEADER_LEN - CRC_LEN):
+            cause = ERROR_LENGTH
+        elif decoders[frame[2]] is None:
+            cause = ERROR_UNKNOWN_ID
+        if cause is not None:
+            if link is not None:
+                link._update_link_stats_errors(cause)
+            continue
+        group = groups.get(frame[2])
+        if group is None:
+            group = groups[frame[2]] = ([], [])
+        group[0].append(index)
+        group[1].append(frame)
+
+    arrays = {}
+    for msg_id, (indices, group_frames) in groups.items():
+        msg_type = msgs.HIPPOLINK_MAP[msg_id]
+        valid = check_many(group_frames,
+                           [msg_type.crc_extra] * len(group_frames))
+        dtype = message_dtype(msg_type)
+        record_len = dtype.itemsize
+        csize = msg_type.unpacker.size
+        # zero initialised, so truncated payloads are padded implicitly
+        buffer = bytearray(sum(valid) * record_len)
+        offset = 0
+        for index, frame, ok in zip(indices, group_frames, valid):
+            if not ok:
+                if link is not None:
+                    link._update_link_stats_errors(ERROR_CRC, msg_id, frame[1])
+                continue
+            _record_header.pack_into(buffer, offset, index, frame[1])
+            payload_len = min(len(frame) - HEADER_LEN - CRC_LEN, csize)
+            start = offset + _record_header.size
+            buffer[start:start + payload_len] = memoryview(
+                frame)[HEADER_LEN:HEADER_LEN + payload_len]
+            offset += record_len
+            if link is not None:
+                link._update_link_stats_received(len(frame), msg_id,
+                                                 frame[1])
+        arrays[msg_id] = np.frombuffer(buffer, dtype=dtype)
+    return arrays
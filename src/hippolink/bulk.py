@@ -0,0 +1,184 @@
+# Parallel decoding of large recorded raw streams (COBS encoded frames as
+# they came in over the port). The capture is cut into chunks right after
+# 0x00 delimiters, so no frame is split, and every chunk is decoded by a
+# worker process with HippoLink.feed (or batch.decode_batch for columnar
+# output). Results are merged in stream order.
+import mmap
+import multiprocessing
+import os
+
+from . import batch
+from . import cobs
+from .hippolink import HippoLink
+from .stats import LinkStats
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+OUTPUTS = ("messages", "dicts", "arrays")
+
+
+def split_chunks(data, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''(start, end) offsets of chunks of about chunk_size bytes.
+
+    Every chunk but the last ends right after a zero delimiter. Offsets
+    are in bytes, also for buffers of larger items.
+    '''
+    if not hasattr(data, "find"):
+        # e.g. a memoryview, search a copy
+        data = memoryview(data).tobytes()
+    chunks = []
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b"\x00", start + chunk_size - 1)
+        end = size if end < 0 else end + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _chunk_to_dicts(messages):
+    dicts = []
+    for msg in messages:
+        d = msg.to_dict()
+        d["node_id"] = msg.get_node_id()
+        dicts.append(d)
+    return dicts
+
+
+def _chunk_to_arrays(link, data):
+    frames = []
+    for frame in link.split_frames(data):
+        # same checks as HippoLink._parse_frame
+        if len(frame) < link.min_msg_len:
+            continue
+        frames.append(cobs.decode(frame))
+    return batch.decode_batch(frames, link), len(frames)
+
+
+def _decode_chunk(task):
+    source, start, end, output, keep_buffers, detailed_stats = task
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+    else:
+        data = source
+    link = HippoLink(None, 0, keep_buffers=keep_buffers)
+    if detailed_stats:
+        link.set_stats(LinkStats())
+    n_frames = 0
+    if output == "arrays":
+        result, n_frames = _chunk_to_arrays(link, data)
+    else:
+        result = link.feed(data)
+        if output == "dicts":
+            result = _chunk_to_dicts(result)
+    return result, n_frames, link.link_stats, link.stats
+
+
+class BulkDecoder(object):
+    '''Decodes recorded raw streams with a pool of worker processes.
+
+    output selects what the chunks are turned into:
+
+    - "messages": message objects (including HippoLink_bad_data for
+      broken frames) like HippoLink.feed returns them
+    - "dicts": msg.to_dict() with an additional node_id key
+    - "arrays": one numpy structured array per msg_id like
+      batch.decode_batch, rx_index counts the frames of the whole capture
+
+    processes=None uses one process per CPU, processes=0 decodes in this
+    process. Messages are sent back from the workers pickled, which costs
+    about as much as decoding them, so keep_buffers is off by default to
+    not transfer the raw frames as well. link_stats (and stats with
+    detailed_stats=True) hold the statistics of all workers summed up
+    after a run.
+    '''
+    def __init__(self, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 output="messages", keep_buffers=False,
+                 detailed_stats=False):
+        if output not in OUTPUTS:
+            raise ValueError("output has to be one of {}.".format(OUTPUTS))
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.output = output
+        self.keep_buffers = keep_buffers
+        self.detailed_stats = detailed_stats
+        self.link_stats = None
+        self.stats = None
+
+    def _tasks(self, source):
+        options = (self.output, self.keep_buffers, self.detailed_stats)
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    # empty files cannot be mapped
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    chunks = split_chunks(m, self.chunk_size)
+            # workers read their chunk of the file themselves, only offsets
+            # are sent
+            return [(source, start, end) + options for start, end in chunks]
+        view = memoryview(source).cast("B")
+        return [(view[start:end].tobytes(), 0, end - start) + options
+                for start, end in split_chunks(view, self.chunk_size)]
+
+    def _merge_stats(self, link_stats, stats):
+        if self.link_stats is None:
+            self.link_stats = dict(link_stats)
+        else:
+            for key, value in link_stats.items():
+                self.link_stats[key] += value
+        if stats is not None:
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.merge(stats)
+
+    def iter_chunks(self, source):
+        '''Yield the decoded chunks of source in stream order.
+
+        source is the path of a capture file or a bytes-like object.
+        Each item is a list of messages/dicts or a dict of arrays.
+        '''
+        self.link_stats = None
+        self.stats = None
+        tasks = self._tasks(source)
+        if self.processes == 0:
+            results = map(_decode_chunk, tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            results = pool.imap(_decode_chunk, tasks)
+        try:
+            frame_offset = 0
+            for result, n_frames, link_stats, stats in results:
+                self._merge_stats(link_stats, stats)
+                if self.output == "arrays":
+                    for array in result.values():
+                        array["rx_index"] += frame_offset
+                    frame_offset += n_frames
+                yield result
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def decode(self, source):
+        '''Decode all of source.
+
+        Returns a list of messages or dicts, or a dict mapping msg_id to
+        one array for output="arrays".
+        '''
+        if self.output != "arrays":
+            decoded = []
+            for result in self.iter_chunks(source):
+                decoded.extend(result)
+            return decoded
+        batch._require_numpy()
+        parts = {}
+        for result in self.iter_chunks(source):
+            for msg_id, array in result.items():
+                parts.setdefault(msg_id, []).append(array)
+        return dict((msg_id, batch.np.concatenate(arrays))
+                    for msg_id, arrays in parts.items())
@@ -1,32 +1,117 @@
+# Consistent Overhead Byte Stuffing. Zeros only show up at block boundaries,
+# so both directions jump from zero to zero and copy the runs in between as
+# slices instead of walking the data byte by byte. encode_into/decode_into
+# write into a caller's buffer without allocating a result, at the cost of
+# more Python level work per run than encode/decode.
+
+MAX_BLOCK_LEN = 254
+
+
+def max_encoded_len(data_len):
+    '''upper bound for the encoded size including the trailing delimiter'''
+    return data_len + data_len // MAX_BLOCK_LEN + 2
+
+
+def _runs(data):
+    if isinstance(data, memoryview):
+        # memoryviews cannot be split. Copying a frame is cheaper than any
+        # find/slice based walk over the view in Python.
+        data = data.tobytes()
+    return data.split(b"\x00")
+
+
 def encode(data):
-    output = bytearray(len(data) + 2)
-    dst_index = 1
-    zero_offset = 1
-    for src_byte in data:
-        if src_byte == 0:
-            output[dst_index - zero_offset] = zero_offset
-            zero_offset = 1
-        else:
-            output[dst_index] = src_byte
-            zero_offset += 1
-        dst_index += 1
-    output[dst_index - zero_offset] = zero_offset
-    output[dst_index] = 0
+    output = bytearray()
+    for run in _runs(data):
+        # runs longer than a block are split into 0xFF blocks which do not
+        # imply a zero after them.
+        while len(run) >= MAX_BLOCK_LEN:
+            output.append(0xFF)
+            output += run[:MAX_BLOCK_LEN]
+            run = run[MAX_BLOCK_LEN:]
+        output.append(len(run) + 1)
+        output += run
+    output.append(0)
     return output
 
 
+def encode_into(data, out, offset=0):
+    '''encode data into out[offset:] and return the number of bytes written.
+
+    The output includes the trailing zero delimiter. out must be a writable
+    buffer with at least max_encoded_len(len(data)) bytes after offset.
+    '''
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    # slices of the view are copied straight into out
+    view = memoryview(data)
+    size = len(data)
+    pos = offset
+    start = 0
+    while True:
+        end = data.find(b"\x00", start)
+        if end < 0:
+            end = size
+        while end - start >= MAX_BLOCK_LEN:
+            out[pos] = 0xFF
+            out[pos + 1:pos + 1 + MAX_BLOCK_LEN] = view[
+                start:start + MAX_BLOCK_LEN]
+            pos += MAX_BLOCK_LEN + 1
+            start += MAX_BLOCK_LEN
+        n = end - start
+        out[pos] = n + 1
+        out[pos + 1:pos + 1 + n] = view[start:end]
+        pos += n + 1
+        if end == size:
+            break
+        start = end + 1
+    out[pos] = 0
+    return pos + 1 - offset
+
+
+def _data_len(data):
+    data_len = len(data)
+    if data_len and data[data_len - 1] == 0:
+        data_len -= 1
+    return data_len
+
+
 def decode(data):
-    if data[-1] == 0:
-        data = data[:-1]
+    data_len = _data_len(data)
     output = bytearray()
-    index = 1
-    offset = data[0] - 1
-    while index < len(data):
-        if offset == 0:
+    index = 0
+    while index < data_len:
+        code = data[index]
+        if code == 0:
+            # not valid COBS, stop instead of looping forever
+            break
+        output += data[index + 1:index + code]
+        index += code
+        if code != 0xFF and index < data_len:
             output.append(0)
-            offset = data[index]
-        else:
-            output.append(data[index])
-        index += 1
-        offset -= 1
     return output
+
+
+def decode_into(data, out, offset=0):
+    '''decode data into out[offset:] and return the number of bytes written.
+
+    A trailing zero delimiter is ignored. out must be a writable buffer with
+    at least len(data) bytes after offset.
+    '''
+    data_len = _data_len(data)
+    view = memoryview(data)
+    pos = offset
+    index = 0
+    while index < data_len:
+        code = data[index]
+        if code == 0:
+            break
+        end = min(index + code, data_len)
+        n = end - index - 1
+        out[pos:pos + n] = view[index + 1:end]
+        pos += n
+        index += code
+        if code != 0xFF and index < data_len:
+            out[pos] = 0
+            pos += 1
+    return pos - offset
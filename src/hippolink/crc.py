@@ -1,3 +1,79 @@
+def _make_table():
+    table = []
+    for i in range(256):
+        tmp = (i ^ (i << 4)) & 0xFF
+        table.append((tmp << 8) ^ (tmp << 3) ^ (tmp >> 4))
+    return tuple(table)
+
+
+CRC_TABLE = _make_table()
+
+
+def _as_bytes_view(buf):
+    '''iterable of ints over buf without copying it'''
+    if isinstance(buf, memoryview) and buf.format != "B":
+        return buf.cast("B")
+    return buf
+
+
+def crc16(buf, crc_extra=None, crc=0xffff):
+    '''CRC-16/MCRF4XX of buf, optionally followed by the crc_extra byte.
+
+    buf may be bytes, bytearray or memoryview and is not copied. The result
+    is identical to x25crc(buf) followed by accumulating crc_extra.
+    '''
+    table = CRC_TABLE
+    for b in _as_bytes_view(buf):
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    if crc_extra is not None:
+        crc = (crc >> 8) ^ table[(crc ^ crc_extra) & 0xFF]
+    return crc
+
+
+def crc16_many(bufs, crc_extras=None):
+    '''list of crc16 values for many buffers in one call.
+
+    crc_extras is either None or a sequence with one crc_extra (or None)
+    per buffer.
+    '''
+    table = CRC_TABLE
+    if crc_extras is None:
+        crc_extras = [None] * len(bufs)
+    result = []
+    append = result.append
+    for buf, crc_extra in zip(bufs, crc_extras):
+        crc = 0xffff
+        for b in _as_bytes_view(buf):
+            crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+        if crc_extra is not None:
+            crc = (crc >> 8) ^ table[(crc ^ crc_extra) & 0xFF]
+        append(crc)
+    return result
+
+
+def check_many(frames, crc_extras):
+    '''list of bools telling whether each frame carries a valid CRC.
+
+    Each frame ends with its little-endian CRC-16 which covers everything
+    in front of it plus the frame's crc_extra byte.
+    '''
+    table = CRC_TABLE
+    result = []
+    append = result.append
+    for frame, crc_extra in zip(frames, crc_extras):
+        frame = _as_bytes_view(memoryview(frame))
+        if len(frame) < 2:
+            append(False)
+            continue
+        crc = 0xffff
+        for b in frame[:-2]:
+            crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+        if crc_extra is not None:
+            crc = (crc >> 8) ^ table[(crc ^ crc_extra) & 0xFF]
+        append(crc == (frame[-2] | (frame[-1] << 8)))
+    return result
+
+
 class x25crc(object):
     '''CRC-16/MCRF4XX - based on checksum.h from mavlink library'''
     def __init__(self, buf=None):
@@ -10,12 +86,7 @@ class x25crc(object):
 
     def accumulate(self, buf):
         '''add in some more bytes'''
-        accum = self.crc
-        for b in buf:
-            tmp = b ^ (accum & 0xff)
-            tmp = (tmp ^ (tmp << 4)) & 0xFF
-            accum = (accum >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)
-        self.crc = accum
+        self.crc = crc16(buf, crc=self.crc)
 
     def accumulate_str(self, buf):
         '''add in some more bytes'''
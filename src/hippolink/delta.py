@@ -0,0 +1,291 @@
+# Delta/keyframe compression of selected message types.
+#
+# Compressed samples travel in frames with the reserved msg_id DELTA_MSG_ID.
+# Payload layout:
+#   base msg_id | seq | ref | data
+# seq counts the samples of the base type per sender (mod 256). ref is 0 for
+# a keyframe, data then is the normal payload of the base type. Otherwise
+# ref is the distance from seq back to the sample the deltas refer to and
+# data is a bitmask of the changed fields (ordered wire fields, one bit
+# each) followed by the zigzag varint coded differences of those fields.
+# Fields are compared as unsigned integers of their wire size, floats by
+# their bit pattern, so the compression is lossless.
+import struct
+
+from . import msgs
+from .crc import crc16
+
+DELTA_MSG_ID = 255
+DELTA_CRC_EXTRA = 0xd7
+# base msg_id, seq, ref
+DELTA_HEADER_LEN = 3
+# largest payload msg_len can describe
+_MAX_PAYLOAD_LEN = msgs.MAX_FRAME_LEN - msgs.HEADER_LEN - msgs.CRC_LEN
+REFERENCES = ("previous", "keyframe")
+
+# unsigned integer view of every scalar struct code
+_UNSIGNED = dict(c="B", b="B", B="B", h="H", H="H", i="I", I="I", q="Q",
+                 Q="Q", f="I", d="Q")
+
+
+def zigzag_varint(value, out):
+    '''Append the zigzag varint of a signed value to out.'''
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_zigzag_varint(data, index):
+    '''(value, next index) of the zigzag varint at data[index].'''
+    value = 0
+    shift = 0
+    while True:
+        byte = data[index]
+        index += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1 if not value & 1 else -(value >> 1) - 1), index
+
+
+class _TypeCodec(object):
+    '''Integer view on the wire fields of one message type.'''
+    def __init__(self, msg_type):
+        if any(msg_type.array_lengths):
+            raise ValueError("Delta compression of {} is not supported, it "
+                             "has array fields.".format(msg_type.name))
+        self.msg_type = msg_type
+        codes = msg_type.format[1:]
+        self.view = struct.Struct(
+            "<" + "".join(_UNSIGNED[code] for code in codes))
+        self.bits = [struct.calcsize(code) * 8 for code in codes]
+        self.masks = [(1 << bits) - 1 for bits in self.bits]
+        self.mask_len = (len(codes) + 7) // 8
+        self.size = self.view.size
+
+    def values(self, msg):
+        return self.view.unpack(
+            self.msg_type.unpacker.pack(
+                *[getattr(msg, name)
+                  for name in self.msg_type.ordered_fieldnames]))
+
+    def encode_delta(self, values, ref_values, out):
+        start = len(out)
+        out += bytes(self.mask_len)
+        for i, (value, ref_value) in enumerate(zip(values, ref_values)):
+            if value == ref_value:
+                continue
+            delta = (value - ref_value) & self.masks[i]
+            if delta >> (self.bits[i] - 1):
+                delta -= 1 << self.bits[i]
+            out[start + (i >> 3)] |= 1 << (i & 7)
+            zigzag_varint(delta, out)
+
+    def decode_delta(self, data, index, ref_values):
+        mask_start = index
+        index += self.mask_len
+        values = list(ref_values)
+        for i in range(len(values)):
+            if not data[mask_start + (i >> 3)] & (1 << (i & 7)):
+                continue
+            delta, index = read_zigzag_varint(data, index)
+            values[i] = (values[i] + delta) & self.masks[i]
+        return values
+
+
+class _TxState(object):
+    __slots__ = ("seq", "since_keyframe", "key_seq", "key_values",
+                 "last_values", "force_keyframe")
+
+    def __init__(self):
+        self.seq = 0
+        self.since_keyframe = 0
+        self.key_seq = None
+        self.key_values = None
+        self.last_values = None
+        self.force_keyframe = False
+
+
+class _RxState(object):
+    __slots__ = ("key_seq", "key_values", "last_seq", "last_values")
+
+    def __init__(self):
+        self.key_seq = None
+        self.key_values = None
+        self.last_seq = None
+        self.last_values = None
+
+
+class DeltaCompression(object):
+    '''Opt-in delta/keyframe compression, see HippoLink.set_delta_compression.
+
+    Samples of msg_types (classes or msg_ids, scalar fields only, at most
+    252 payload bytes so keyframes fit into a frame) are sent as a
+    keyframe every keyframe_interval samples and as deltas in between.
+    Samples whose delta would not be smaller than their normal payload are
+    sent as normal frames. reference selects what deltas refer to:
+
+    - "previous": the previous sample. Smallest deltas, but a lost frame
+      makes the following deltas undecodable until the next keyframe.
+    - "keyframe": the last keyframe. A lost delta only loses itself.
+
+    The receiving side decodes compressed frames of any type, msg_types
+    only selects what is compressed when sending. Deltas whose reference
+    sample has not been received are dropped as receive error (cause
+    "delta") and counted in stats. Call force_keyframe e.g. when the
+    receiver reports such losses over a back channel.
+    '''
+    def __init__(self, msg_types=(), keyframe_interval=50,
+                 reference="previous"):
+        if not 1 <= keyframe_interval <= 255:
+            raise ValueError("keyframe_interval has to be in [1, 255].")
+        if reference not in REFERENCES:
+            raise ValueError(
+                "reference has to be one of {}.".format(REFERENCES))
+        self.keyframe_interval = keyframe_interval
+        self.reference = reference
+        self._codecs = {}
+        self._tx = {}
+        self._rx = {}
+        self._out = bytearray()
+        self.stats = dict(keyframes_sent=0,
+                          deltas_sent=0,
+                          plain_sent=0,
+                          keyframes_received=0,
+                          deltas_received=0,
+                          deltas_dropped=0)
+        for msg_type in msg_types:
+            msg_id = getattr(msg_type, "id", msg_type)
+            codec = self._codec(msg_id)
+            if DELTA_HEADER_LEN + codec.size > _MAX_PAYLOAD_LEN:
+                raise ValueError(
+                    "Delta compression of {} is not supported, its "
+                    "keyframes do not fit into a frame.".format(
+                        codec.msg_type.name))
+            self._tx[msg_id] = _TxState()
+
+    def _codec(self, msg_id):
+        codec = self._codecs.get(msg_id)
+        if codec is None:
+            codec = self._codecs[msg_id] = _TypeCodec(
+                msgs.HIPPOLINK_MAP[msg_id])
+        return codec
+
+    def force_keyframe(self, msg_id=None):
+        '''Send the next sample of msg_id (default: of all types) in full.'''
+        msg_id = getattr(msg_id, "id", msg_id)
+        for key, state in self._tx.items():
+            if msg_id is None or key == msg_id:
+                state.force_keyframe = True
+
+    def pack_into(self, msg, buffer, offset, node_id):
+        '''Write msg as compressed frame to buffer[offset:].
+
+        Returns the frame length or None if msg is to be sent as normal
+        frame. msg itself is not modified.
+        '''
+        msg_id = msg.get_msg_id()
+        state = self._tx.get(msg_id)
+        if state is None:
+            return None
+        codec = self._codecs[msg_id]
+        values = codec.values(msg)
+        out = self._out
+        del out[:]
+        out += bytes((msg_id, state.seq, 0))
+        keyframe = (state.last_values is None or state.force_keyframe
+                    or state.since_keyframe >= self.keyframe_interval)
+        if not keyframe:
+            if self.reference == "previous":
+                ref, ref_values = 1, state.last_values
+            else:
+                ref = (state.seq - state.key_seq) & 0xff
+                ref_values = state.key_values
+            out[2] = ref
+            codec.encode_delta(values, ref_values, out)
+            if len(out) >= codec.size:
+                # does not pay off, send the uncompressed frame. Receivers
+                # do not track those, so the state is left as it is.
+                self.stats["plain_sent"] += 1
+                return None
+        if keyframe:
+            out += codec.view.pack(*values)
+            state.key_seq = state.seq
+            state.key_values = values
+            state.since_keyframe = 0
+            state.force_keyframe = False
+            self.stats["keyframes_sent"] += 1
+        else:
+            self.stats["deltas_sent"] += 1
+        state.since_keyframe += 1
+        state.last_values = values
+        state.seq = (state.seq + 1) & 0xff
+        buffer[offset + 1] = node_id
+        buffer[offset + 2] = DELTA_MSG_ID
+        start = offset + msgs.HEADER_LEN
+        end = start + len(out)
+        buffer[start:end] = out
+        # like HippoLinkMessage._finish_frame, but without storing the
+        # header of the compressed frame in msg
+        while end > start + 1 and buffer[end - 1] == 0:
+            end -= 1
+        buffer[offset] = end - start
+        msgs.crc_packer.pack_into(
+            buffer, end, crc16(memoryview(buffer)[offset:end],
+                               DELTA_CRC_EXTRA))
+        return end - offset + msgs.CRC_LEN
+
+    def decode_payload(self, node_id, payload):
+        '''(message type, packed payload) of a compressed frame's payload.
+
+        Raises KeyError for unknown message types and ValueError if the
+        frame cannot be decoded.
+        '''
+        # trailing zeros may have been truncated
+        data = bytes(payload)
+        base_id, seq, ref = (data + bytes(DELTA_HEADER_LEN))[:3]
+        if base_id not in msgs.HIPPOLINK_REGISTRY:
+            raise KeyError(base_id)
+        codec = self._codec(base_id)
+        data += bytes(max(0, DELTA_HEADER_LEN + codec.mask_len +
+                          codec.size - len(data)))
+        key = (node_id, base_id)
+        state = self._rx.get(key)
+        if state is None:
+            state = self._rx[key] = _RxState()
+        if ref == 0:
+            values = codec.view.unpack_from(data, DELTA_HEADER_LEN)
+            state.key_seq = seq
+            state.key_values = values
+            self.stats["keyframes_received"] += 1
+        else:
+            ref_seq = (seq - ref) & 0xff
+            if state.last_seq == ref_seq and state.last_values is not None:
+                ref_values = state.last_values
+            elif state.key_seq == ref_seq:
+                ref_values = state.key_values
+            else:
+                self.stats["deltas_dropped"] += 1
+                raise ValueError(
+                    "Reference sample {} of delta {} (msg_id={}) is "
+                    "missing.".format(ref_seq, seq, base_id))
+            try:
+                values = codec.decode_delta(data, DELTA_HEADER_LEN,
+                                            ref_values)
+            except IndexError:
+                self.stats["deltas_dropped"] += 1
+                raise ValueError("Truncated delta (msg_id={}).".format(
+                    base_id))
+            self.stats["deltas_received"] += 1
+        state.last_seq = seq
+        state.last_values = values
+        return codec.msg_type, codec.view.pack(*values)
+
+    def reset(self):
+        '''Forget all sent and received samples.'''
+        for msg_id in self._tx:
+            self._tx[msg_id] = _TxState()
+        self._rx.clear()
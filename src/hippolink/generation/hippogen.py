@@ -1,13 +1,17 @@
 from . import hippoparse
 from . import hippogen_python
 
+import glob
 import os
 
 
 def generate_python():
     this_files_dir = os.path.dirname(os.path.realpath(__file__))
     def_path = os.path.join(this_files_dir, "..", "definitions")
-    xml_path = os.path.join(def_path, "hippolink.xml")
+    # every XML file is a dialect, hippolink.xml comes first
+    xml_paths = sorted(glob.glob(os.path.join(def_path, "*.xml")),
+                       key=lambda path: (os.path.basename(path) !=
+                                         "hippolink.xml", path))
     messages_dir = os.path.join(this_files_dir, "..")
-    m = hippoparse.HippoXml(xml_path)
-    hippogen_python.generate([m], os.path.join(messages_dir, "msgs.py"))
+    xmls = [hippoparse.HippoXml(xml_path) for xml_path in xml_paths]
+    hippogen_python.generate(xmls, os.path.join(messages_dir, "msgs.py"))
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import glob
+import os
 import textwrap
 from yapf.yapflib.yapf_api import FormatFile
 
@@ -9,9 +11,11 @@ def generate_preamble(f):
 # Auto-generated.
 
 from __future__ import print_function
+import array
+import importlib
 import struct
-import json
-from hippolink.crc import x25crc
+import sys
+from hippolink.crc import crc16
 
 def to_string(s):
     try:
@@ -35,6 +39,71 @@ def to_string(s):
         pass
     return r+ "_XXX"
 
+HEADER_LEN = 3
+CRC_LEN = 2
+MAX_FRAME_LEN = HEADER_LEN + 255 + CRC_LEN
+crc_packer = struct.Struct("<H")
+# array.array typecodes of numeric array fields equal their struct codes
+ARRAY_ITEMSIZES = dict(f=4, d=8, b=1, B=1, h=2, H=2, i=4, I=4, q=8, Q=8)
+ARRAY_DTYPES = dict(f="<f4", d="<f8", b="|i1", B="|u1", h="<i2", H="<u2",
+                    i="<i4", I="<u4", q="<i8", Q="<u8")
+NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+_numpy = None
+
+
+def unpack_array(typecode, payload, offset, count, numpy_arrays=False):
+    '''Value of a numeric array field.
+
+    An array.array copy of the elements, or with numpy_arrays a numpy
+    view on payload.
+    '''
+    if numpy_arrays:
+        global _numpy
+        if _numpy is None:
+            import numpy
+            _numpy = numpy
+        return _numpy.frombuffer(payload, ARRAY_DTYPES[typecode], count,
+                                 offset)
+    values = array.array(typecode)
+    values.frombytes(payload[offset:offset + count *
+                             ARRAY_ITEMSIZES[typecode]])
+    if not NATIVE_LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def pack_array(packer, typecode, buffer, offset, values):
+    # array.array and numpy values already in wire layout are copied as is,
+    # anything else is packed with a single struct call
+    if type(values) is array.array:
+        wire_layout = values.typecode == typecode and NATIVE_LITTLE_ENDIAN
+    else:
+        wire_layout = getattr(getattr(values, "dtype", None), "str",
+                              None) == ARRAY_DTYPES[typecode]
+    if wire_layout:
+        data = values.tobytes()
+        if len(data) == packer.size:
+            buffer[offset:offset + packer.size] = data
+            return
+    packer.pack_into(buffer, offset, *values)
+
+
+class LazyStruct(object):
+    '''struct.Struct class attribute that is compiled on first access.'''
+    def __init__(self, fmt):
+        self.format = fmt
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        compiled = struct.Struct(self.format)
+        # replace the descriptor, later accesses are plain lookups
+        setattr(cls, self.name, compiled)
+        return compiled
+
+
 class HippoLinkHeader(object):
     def __init__(self, msg_id, msg_len=0, node_id=0):
         self.msg_len = msg_len
@@ -47,27 +116,66 @@ class HippoLinkHeader(object):
 
 
 class HippoLinkMessage(object):
-    def __init__(self, msg_id, name):
-        self._header = HippoLinkHeader(msg_id=msg_id)
+    # the header lives in plain slots instead of a HippoLinkHeader object.
+    # _type and _fieldnames are provided by the subclasses.
+    __slots__ = ("_msg_id", "_msg_len", "_node_id", "_payload",
+                 "_msg_buffer", "_crc", "_lazy_payload")
+    _type = None
+    _fieldnames = []
+
+    def __init__(self, msg_id, name=None):
+        self._msg_id = msg_id
+        self._msg_len = 0
+        self._node_id = 0
         self._payload = None
         self._msg_buffer = None
         self._crc = None
-        self._fieldnames = []
-        self._type = name
+        # zero padded payload of a lazily decoded message whose fields have
+        # not been unpacked yet
+        self._lazy_payload = None
+
+    @classmethod
+    def _decode_lazy(cls, payload):
+        msg = cls.__new__(cls)
+        HippoLinkMessage.__init__(msg, cls.id)
+        msg._lazy_payload = payload
+        return msg
+
+    def __getattr__(self, name):
+        # only reached for unset slots, i.e. the fields of a lazily decoded
+        # message. Unpack all fields at once and keep the ones that have
+        # been assigned in the meantime.
+        if name.startswith("_") or name not in self._fieldnames:
+            raise AttributeError(name)
+        payload = self._lazy_payload
+        if payload is None:
+            raise AttributeError(name)
+        self._lazy_payload = None
+        assigned = [(field, getattr(self, field))
+                    for field in self._fieldnames if hasattr(self, field)]
+        self._unpack_into(payload)
+        for field, value in assigned:
+            setattr(self, field, value)
+        return getattr(self, name)
 
     def format_attr(self, field):
         raw_attr = getattr(self, field)
         if isinstance(raw_attr, bytes):
             raw_attr = to_string(raw_attr).rstrip("\\00")
+        elif hasattr(raw_attr, "tolist"):
+            # array.array or numpy values of array fields
+            raw_attr = raw_attr.tolist()
         return raw_attr
 
     def get_msg_buffer(self):
-        if isinstance(self._msg_buffer, bytearray):
+        if self._msg_buffer is None or isinstance(self._msg_buffer,
+                                                  bytearray):
             return self._msg_buffer
         return bytearray(self._msg_buffer)
 
     def get_header(self):
-        return self._header
+        return HippoLinkHeader(msg_id=self._msg_id, msg_len=self._msg_len,
+            node_id=self._node_id)
 
     def get_payload(self):
         return self._payload
@@ -82,10 +190,10 @@ class HippoLinkMessage(object):
         return self._type
 
     def get_msg_id(self):
-        return self._header.msg_id
+        return self._msg_id
 
     def get_node_id(self):
-        return self._header.node_id
+        return self._node_id
 
     def __str__(self):
         ret = "%s {" % self._type
@@ -103,7 +211,7 @@ class HippoLinkMessage(object):
             return False
         if self.get_type() != other.get_type():
             return False
-        if self.get_node_id() != other.node_id():
+        if self.get_node_id() != other.get_node_id():
             return False
         for name in self._fieldnames:
             if self.format_attr(name) != other.format_attr(name):
@@ -118,25 +226,58 @@ class HippoLinkMessage(object):
         return d
 
     def to_json(self):
+        import json
         return json.dumps(self.to_dict())
 
-    def pack(self, hippo, crc_extra, payload):
-        n = len(payload)
-        nullbyte = chr(0)
-        if str(type(payload)) == "<class 'bytes'>":
-            nullbyte = 0
-        # truncate trailing zeros
-        while n > 1 and payload[n-1] == nullbyte:
-            n -= 1
-        self._payload = payload[:n]
-        self._header = HippoLinkHeader(msg_id=self._header.msg_id,
-            msg_len=len(self._payload), node_id=hippo.node_id)
-        self._msg_buffer = self._header.pack() + self._payload
-        crc = x25crc(self._msg_buffer)
-        crc.accumulate_str(struct.pack("B", crc_extra))
-        self._crc = crc.crc
-        self._msg_buffer += struct.pack("<H", self._crc)
-        return self._msg_buffer
+    def pack(self, hippo):
+        buffer = bytearray(MAX_FRAME_LEN)
+        frame_len = self.pack_into(buffer, 0, hippo.node_id)
+        del buffer[frame_len:]
+        self._msg_buffer = buffer
+        self._payload = buffer[HEADER_LEN:-CRC_LEN]
+        return buffer
+
+    def pack_into(self, buffer, offset, node_id):
+        '''Write the complete frame to buffer[offset:].
+
+        Returns the frame length. Generated message classes override this
+        with an unrolled version, this generic one packs the fields listed
+        in ordered_fieldnames with the class' unpacker.
+        '''
+        unpacker = getattr(self, "unpacker", None)
+        if unpacker is None:
+            raise TypeError("{} has no wire format.".format(self._type))
+        # array_lengths is in declaration order
+        array_lengths = dict(zip(self.fieldnames, self.array_lengths))
+        values = []
+        for name in self.ordered_fieldnames:
+            value = getattr(self, name)
+            if array_lengths[name] and not isinstance(value, (bytes, str)):
+                values.extend(value)
+            else:
+                values.append(value)
+        buffer[offset + 1] = node_id
+        buffer[offset + 2] = self._msg_id
+        unpacker.pack_into(buffer, offset + HEADER_LEN, *values)
+        return self._finish_frame(buffer, offset, unpacker.size,
+                                  self.crc_extra)
+
+    def _finish_frame(self, buffer, offset, payload_size, crc_extra):
+        # header and full payload are already in buffer. Truncate trailing
+        # zeros of the payload (keeping at least one byte), then fill in the
+        # length and append the CRC.
+        end = offset + HEADER_LEN + payload_size
+        start = offset + HEADER_LEN + 1
+        while end > start and buffer[end - 1] == 0:
+            end -= 1
+        msg_len = end - offset - HEADER_LEN
+        buffer[offset] = msg_len
+        crc = crc16(memoryview(buffer)[offset:end], crc_extra)
+        crc_packer.pack_into(buffer, end, crc)
+        self._msg_len = msg_len
+        self._node_id = buffer[offset + 1]
+        self._crc = crc
+        return msg_len + HEADER_LEN + CRC_LEN
 
     def __getitem(self, key):
         if self._instances is None:
@@ -159,6 +300,10 @@ def byname_hash_from_field_attribute(msg, attribute):
     return ", ".join(strings)
 
 
+def message_classname(msg):
+    return "HippoLink_{}_message".format(msg.name.lower())
+
+
 def generate_message_ids(f, msgs):
     print("Generating message IDs.")
     f.write("\n# message IDs\n")
@@ -172,7 +317,7 @@ def generate_classes(f, msgs):
     wrapper = textwrap.TextWrapper(initial_indent="    ",
                                    subsequent_indent="    ")
     for msg in msgs:
-        classname = "HippoLink_{}_message".format(msg.name.lower())
+        classname = message_classname(msg)
         fieldname_str = ", ".join(["'{}'".format(s) for s in msg.fieldnames])
         ordered_fieldname_str = ", ".join(
             ["'{}'".format(s) for s in msg.ordered_fieldnames])
@@ -199,9 +344,15 @@ class {classname}(HippoLinkMessage):
     lengths = {len_map}
     array_lengths = {array_len_map}
     crc_extra = {crc_extra}
-    unpacker = struct.Struct('{fmtstr}')
-
-    def __init__(self""".format(
+    unpacker = LazyStruct('{fmtstr}')
+    # header (with msg_len filled in later) followed by the payload, the
+    # bytes of numeric array fields are skipped and packed separately
+    packer = LazyStruct('<BBB{scalar_fmtstr_nobo}')
+    dtype_descr = [{dtype_descr}]
+    _type = name
+    _fieldnames = fieldnames
+    __slots__ = ({slots_str})
+""".format(
             classname=classname,
             description=wrapper.fill(msg.description.strip()),
             id=msg.name.upper(),
@@ -212,11 +363,23 @@ class {classname}(HippoLinkMessage):
             fieldenums_str=fieldenums_str,
             fieldunits_str=fieldunits_str,
             fmtstr=msg.fmtstr,
+            scalar_fmtstr_nobo=msg.scalar_fmtstr[1:],
             order_map=msg.order_map,
             len_map=msg.len_map,
             array_len_map=msg.array_len_map,
             crc_extra=msg.crc_extra,
+            dtype_descr=", ".join([hippodtype(field)
+                                   for field in msg.ordered_fields]),
+            slots_str="".join(["'{}', ".format(s) for s in msg.fieldnames]),
         ))
+        if msg.has_arrays:
+            f.write("    _scalar_unpacker = LazyStruct('{}')\n".format(
+                msg.scalar_fmtstr))
+            for field in msg.ordered_fields:
+                if is_numeric_array(field):
+                    f.write("    _{}_packer = LazyStruct('<{}')\n".format(
+                        field.name, hippofmt(field)))
+        f.write("\n    def __init__(self")
         for i in range(len(msg.fields)):
             fname = msg.fieldnames[i]
 
@@ -225,23 +388,78 @@ class {classname}(HippoLinkMessage):
         f.write("        super({classname}, self).__init__(msg_id="
                 "{classname}.id, name={classname}.name)\n".format(
                     classname=classname))
-        f.write("        self._fieldnames = {classname}.fieldnames\n".format(
-            classname=classname))
         for field in msg.fields:
             f.write("        self.{name} = {name}\n".format(name=field.name))
         f.write("""
-    def pack(self, hippo):
-        return HippoLinkMessage.pack(self, hippo, {crc_extra},
-            struct.pack('{fmtstr}'"""
-                .format(crc_extra=msg.crc_extra, fmtstr=msg.fmtstr))
+    def pack_into(self, buffer, offset, node_id):
+        '''Write the complete frame to buffer[offset:].
+
+        Returns the frame length. buffer needs room for MAX_FRAME_LEN bytes.
+        '''
+        self.packer.pack_into(buffer, offset, 0, node_id, self.id""")
         for field in msg.ordered_fields:
-            if field.type != "char" and field.array_length > 1:
-                for i in range(field.array_length):
-                    f.write(", self.{name}[{index}]".format(name=field.name,
-                                                            index=i))
-            else:
+            if not is_numeric_array(field):
                 f.write(", self.{name}".format(name=field.name))
-        f.write("))\n")
+        f.write(")\n")
+        for field in msg.ordered_fields:
+            if is_numeric_array(field):
+                f.write("        pack_array(self._{name}_packer, "
+                        "'{typecode}', buffer, offset + {offset}, "
+                        "self.{name})\n".format(
+                            name=field.name,
+                            typecode=hippofmt(field)[-1],
+                            offset=3 + field.wire_offset))
+        f.write("        return self._finish_frame(buffer, offset, {size}, "
+                "{crc_extra})\n".format(size=msg.wire_length,
+                                        crc_extra=msg.crc_extra))
+        generate_decode(f, msg)
+
+
+def is_numeric_array(field):
+    return field.type != "char" and field.array_length > 0
+
+
+def generate_decode(f, msg):
+    # constructor argument of each field. Numeric arrays are not part of the
+    # scalar unpacker, their bytes are skipped with pad bytes.
+    scalar_index = dict(
+        (field.name, i) for i, field in enumerate(
+            [field for field in msg.ordered_fields
+             if not is_numeric_array(field)]))
+    args = []
+    for field in msg.fields:
+        if is_numeric_array(field):
+            args.append(
+                "unpack_array('{}', payload, {}, {}, numpy_arrays)".format(
+                    hippofmt(field)[-1], field.wire_offset,
+                    field.array_length))
+        else:
+            args.append("fields[{}]".format(scalar_index[field.name]))
+    if args == ["fields[{}]".format(i) for i in range(len(args))]:
+        # unpacked order already matches the constructor
+        f.write("""
+    @classmethod
+    def _decode(cls, payload, numpy_arrays=False):
+        return cls(*cls.unpacker.unpack_from(payload))
+
+    def _unpack_into(self, payload, numpy_arrays=False):
+        {targets} = self.unpacker.unpack_from(payload)
+""".format(targets=", ".join(
+            "self." + field.name for field in msg.fields) +
+            ("," if len(msg.fields) == 1 else "")))
+        return
+    unpacker = "_scalar_unpacker" if msg.has_arrays else "unpacker"
+    f.write("""
+    @classmethod
+    def _decode(cls, payload, numpy_arrays=False):
+        fields = cls.{unpacker}.unpack_from(payload)
+        return cls({args})
+
+    def _unpack_into(self, payload, numpy_arrays=False):
+        fields = self.{unpacker}.unpack_from(payload)
+""".format(unpacker=unpacker, args=", ".join(args)))
+    for field, arg in zip(msg.fields, args):
+        f.write("        self.{} = {}\n".format(field.name, arg))
 
 
 def hippofmt(field):
@@ -265,6 +483,29 @@ def hippofmt(field):
     return map[field.type]
 
 
+def hippodtype(field):
+    # numpy structured dtype entry matching the packed struct layout
+    map = dict(
+        float="<f4",
+        double="<f8",
+        char="S1",
+        int8_t="i1",
+        uint8_t="u1",
+        int16_t="<i2",
+        uint16_t="<u2",
+        int32_t="<i4",
+        uint32_t="<u4",
+        int64_t="<i8",
+        uint64_t="<u8",
+    )
+    if field.array_length:
+        if field.type == "char":
+            return "('{}', 'S{}')".format(field.name, field.array_length)
+        return "('{}', '{}', ({},))".format(field.name, map[field.type],
+                                            field.array_length)
+    return "('{}', '{}')".format(field.name, map[field.type])
+
+
 def hippodefault(field):
     if field.type == "char":
         default_value = "''"
@@ -275,41 +516,205 @@ def hippodefault(field):
     return "[" + ", ".join([default_value] * field.array_length) + "]"
 
 
-def generate_hippolink(f, msgs):
-    f.write("\n\nHIPPOLINK_MAP = {\n")
-    for msg in msgs:
-        f.write("    HIPPOLINK_MSG_ID_{} : HippoLink_{}_message,\n".format(
-            msg.name.upper(), msg.name.lower()))
-    f.write("}\n\n")
+def generate_registry(f, dialects):
+    f.write("""
+
+# msg_id: (dialect module, class name) of all messages. The dialect modules
+# in hippolink.dialects are only imported once one of their messages is
+# looked up.
+HIPPOLINK_REGISTRY = {
+""")
+    for dialect, msgs in dialects:
+        for msg in msgs:
+            f.write("    HIPPOLINK_MSG_ID_{}: ('{}', '{}'),\n".format(
+                msg.name.upper(), dialect, message_classname(msg)))
+    f.write("""}
+_CLASS_IDS = dict((classname, msg_id) for msg_id, (_, classname)
+                  in HIPPOLINK_REGISTRY.items())
+
+
+class _MessageMap(dict):
+    # msg_id -> message class. Only the classes looked up so far are
+    # stored, missing ones are imported from their dialect module.
+    def __missing__(self, msg_id):
+        dialect, classname = HIPPOLINK_REGISTRY[msg_id]
+        module = importlib.import_module(".dialects." + dialect, __package__)
+        msg_type = getattr(module, classname)
+        self[msg_id] = msg_type
+        HIPPOLINK_DECODERS[msg_id] = msg_type._decode
+        return msg_type
+
+    def get(self, msg_id, default=None):
+        if msg_id in HIPPOLINK_REGISTRY:
+            return self[msg_id]
+        return default
+
+    def __contains__(self, msg_id):
+        return msg_id in HIPPOLINK_REGISTRY
+
+    def __iter__(self):
+        return iter(HIPPOLINK_REGISTRY)
+
+    def __len__(self):
+        return len(HIPPOLINK_REGISTRY)
+
+    def keys(self):
+        return HIPPOLINK_REGISTRY.keys()
+
+    def values(self):
+        return [self[msg_id] for msg_id in HIPPOLINK_REGISTRY]
+
+    def items(self):
+        return [(msg_id, self[msg_id]) for msg_id in HIPPOLINK_REGISTRY]
+
+
+HIPPOLINK_MAP = _MessageMap()
+
+
+def _lazy_decoder(msg_id):
+    # replaced by the real decoder once the class has been loaded
+    def decode(payload, numpy_arrays=False):
+        return HIPPOLINK_MAP[msg_id]._decode(payload, numpy_arrays)
+    return decode
 
+
+# payload decoders indexed by msg_id
+HIPPOLINK_DECODERS = [None] * 256
+for _msg_id in HIPPOLINK_REGISTRY:
+    HIPPOLINK_DECODERS[_msg_id] = _lazy_decoder(_msg_id)
+
+
+def load_all():
+    '''Import all dialect modules and their message classes.'''
+    for msg_id in HIPPOLINK_REGISTRY:
+        HIPPOLINK_MAP[msg_id]
+
+
+def __getattr__(name):
+    # message classes are available as module attributes, e.g.
+    # msgs.HippoLink_pose_message
+    msg_id = _CLASS_IDS.get(name)
+    if msg_id is None:
+        raise AttributeError(
+            "module '{}' has no attribute '{}'".format(__name__, name))
+    return HIPPOLINK_MAP[msg_id]
+""")
+
+
+def generate_dialect_preamble(f, dialect, xml):
     f.write("""
+# Auto-generated from {xml}, dialect '{dialect}'.
+
+from hippolink.msgs import (HippoLinkMessage, LazyStruct, pack_array,
+                            unpack_array)
+""".format(xml=xml.basename, dialect=dialect))
 
 
-    """)
+def dialect_name(xml):
+    name = os.path.splitext(xml.basename)[0].replace("-", "_")
+    if not name.isidentifier():
+        raise Exception("Dialect name '{}' of {} is not a valid module "
+                        "name.".format(name, xml.filename))
+    return name
+
+
+# msg_ids the link uses itself, see delta.DELTA_MSG_ID
+RESERVED_MSG_IDS = {255: "delta compressed frames"}
+
+
+def check_conflicts(xml):
+    """Raise if msg_ids, message names or dialect names are not unique."""
+    by_id = {}
+    by_name = {}
+    dialects = {}
+    for x in xml:
+        dialect = dialect_name(x)
+        if dialect in dialects:
+            raise Exception("Dialect '{}' is defined by {} and {}.".format(
+                dialect, dialects[dialect], x.filename))
+        dialects[dialect] = x.filename
+        for msg in x.message:
+            where = "{}:{}".format(x.filename, msg.linenumber)
+            if not 0 <= msg.id <= 255:
+                raise Exception("msg_id {} of '{}' at {} does not fit into "
+                                "the header.".format(msg.id, msg.name, where))
+            if msg.id in RESERVED_MSG_IDS:
+                raise Exception("msg_id {} of '{}' at {} is reserved for "
+                                "{}.".format(msg.id, msg.name, where,
+                                             RESERVED_MSG_IDS[msg.id]))
+            if msg.id in by_id:
+                raise Exception(
+                    "Duplicate msg_id {}: '{}' at {} and '{}' at {}.".format(
+                        msg.id, by_id[msg.id][0], by_id[msg.id][1], msg.name,
+                        where))
+            by_id[msg.id] = (msg.name, where)
+            name = msg.name.upper()
+            if name in by_name:
+                raise Exception(
+                    "Duplicate message name '{}' at {} and {}.".format(
+                        name, by_name[name], where))
+            by_name[name] = where
+
+
+def prepare_message(msg):
+    msg.fielddefaults = []
+    msg.fmtstr = "<"
+    # like fmtstr, but with pad bytes in place of numeric arrays
+    msg.scalar_fmtstr = "<"
+    msg.has_arrays = False
+    for field in msg.ordered_fields:
+        msg.fmtstr += hippofmt(field)
+        if is_numeric_array(field):
+            msg.scalar_fmtstr += "{}x".format(field.wire_length)
+            msg.has_arrays = True
+        else:
+            msg.scalar_fmtstr += hippofmt(field)
+        msg.fielddefaults.append(hippodefault(field))
+    msg.order_map = [0] * len(msg.fieldnames)
+    msg.len_map = [0] * len(msg.fieldnames)
+    msg.array_len_map = [0] * len(msg.fieldnames)
+    for i in range(len(msg.fieldnames)):
+        msg.order_map[i] = msg.ordered_fieldnames.index(msg.fieldnames[i])
+        msg.array_len_map[i] = msg.fields[i].array_length
+        n = msg.order_map[i]
+        msg.len_map[n] = msg.fieldlengths[i]
 
 
 def generate(xml, out_path):
-    filename = out_path
-    msgs = []
+    """Generate the msgs module at out_path and one module per dialect.
+
+    The message classes of each XML file go into dialects/<name>.py next to
+    out_path, msgs.py holds the common base classes, all message IDs and the
+    registry that imports the dialect modules on demand.
+    """
+    check_conflicts(xml)
+    dialects = []
     for x in xml:
-        msgs.extend(x.message)
-    for msg in msgs:
-        msg.fielddefaults = []
-        msg.fmtstr = "<"
-        for field in msg.ordered_fields:
-            msg.fmtstr += hippofmt(field)
-            msg.fielddefaults.append(hippodefault(field))
-        msg.order_map = [0] * len(msg.fieldnames)
-        msg.len_map = [0] * len(msg.fieldnames)
-        msg.array_len_map = [0] * len(msg.fieldnames)
-        for i in range(len(msg.fieldnames)):
-            msg.order_map[i] = msg.ordered_fieldnames.index(msg.fieldnames[i])
-            msg.array_len_map[i] = msg.ordered_fields[i].array_length
-            n = msg.order_map[i]
-            msg.len_map[n] = msg.fieldlengths[i]
-    with open(filename, "w") as f:
+        for msg in x.message:
+            prepare_message(msg)
+        dialects.append((dialect_name(x), x.message))
+    all_msgs = [msg for _, msgs in dialects for msg in msgs]
+
+    dialects_dir = os.path.join(os.path.dirname(out_path), "dialects")
+    if not os.path.isdir(dialects_dir):
+        os.makedirs(dialects_dir)
+    # remove modules of dialects that no longer exist
+    for path in glob.glob(os.path.join(dialects_dir, "*.py")):
+        os.remove(path)
+    filenames = [out_path]
+    with open(out_path, "w") as f:
         generate_preamble(f)
-        generate_message_ids(f, msgs)
-        generate_classes(f, msgs)
-        generate_hippolink(f, msgs)
-    FormatFile(filename, in_place=True)
+        generate_message_ids(f, all_msgs)
+        generate_registry(f, dialects)
+    init_path = os.path.join(dialects_dir, "__init__.py")
+    with open(init_path, "w") as f:
+        f.write("# Auto-generated. One module per message dialect.\n")
+    for x, (dialect, msgs) in zip(xml, dialects):
+        filename = os.path.join(dialects_dir, dialect + ".py")
+        with open(filename, "w") as f:
+            generate_dialect_preamble(f, dialect, x)
+            generate_message_ids(f, msgs)
+            generate_classes(f, msgs)
+        filenames.append(filename)
+    for filename in filenames:
+        FormatFile(filename, in_place=True)
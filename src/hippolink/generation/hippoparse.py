@@ -130,7 +130,7 @@ class HippoField(object):
         return bool("[" in type)
 
     def _parse_array(self, type):
-        m = re.search(r"([a-zA-Z0-9]+?)\[(0-9+)\]", type)
+        m = re.match(r"\s*([a-zA-Z0-9_]+)\s*\[\s*([0-9]+)\s*\]\s*$", type)
         if not m:
             raise Exception("Could not parse type: '{}'".format(type))
         type = m.group(1)
@@ -142,7 +142,9 @@ class HippoField(object):
         else:
             raise Exception("Unknown type: '{}'".format(type))
         self.type_length = TYPE_LENGTHS[self.type]
-        self.array_length = length
+        self.array_length = int(length)
+        if self.array_length < 1:
+            raise Exception("Invalid array length: '{}'".format(type))
         self.wire_length = self.array_length * self.type_length
 
     def _parse_non_array(self, type):
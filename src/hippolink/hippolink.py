@@ -1,21 +1,33 @@
 import struct
+import time
+from timeit import default_timer
 
 from . import msgs
 from . import cobs
-from .crc import x25crc
+from . import batch
+from . import logfile
+from .delta import DELTA_MSG_ID, DELTA_CRC_EXTRA
+from .stats import (ERROR_SHORT, ERROR_HEADER, ERROR_LENGTH,
+                    ERROR_UNKNOWN_ID, ERROR_CRC, ERROR_PAYLOAD,
+                    ERROR_INSTANTIATE, ERROR_FRAMING, ERROR_TYPE,
+                    ERROR_DELTA)
+from .crc import crc16
 
 
 class HippoLinkError(Exception):
-    def __init__(self, msg):
+    def __init__(self, msg, cause=None):
         Exception.__init__(self, msg)
         self.message = msg
+        self.cause = cause
 
 
 class HippoLink_bad_data(msgs.HippoLinkMessage):
+    _type = "BAD_DATA"
+    _fieldnames = ["data", "reason"]
+
     def __init__(self, data, reason):
         super(HippoLink_bad_data,
               self).__init__(msgs.HIPPOLINK_MSG_ID_BAD_DATA, "BAD_DATA")
-        self._fieldnames = ["data", "reason"]
         self.data = data
         self.reason = reason
         self._msg_buffer = data
@@ -25,147 +37,600 @@ class HippoLink_bad_data(msgs.HippoLinkMessage):
 
 
 class HippoLink(object):
-    def __init__(self, port, node_id):
+    def __init__(self, port, node_id, keep_buffers=True, zero_copy=False,
+                 lazy=False, numpy_arrays=False):
         self.port = port
         self.node_id = node_id
+        # keep references to the raw frame and payload on decoded messages
+        self.keep_buffers = keep_buffers
+        # store memoryviews on the received buffer instead of copies
+        self.zero_copy = zero_copy
+        # unpack the fields of decoded messages on first access
+        self.lazy = lazy
+        # decode numeric array fields as numpy views on the received frame
+        # instead of array.array copies
+        self.numpy_arrays = numpy_arrays
         self.send_callback = None
         self.send_callback_args = None
         self.send_callback_kwargs = None
+        self.log_writer = None
+        # stats.LinkStats for detailed statistics, disabled while None
+        self.stats = None
+        # buffered sending is disabled while flush_size is None
+        self.flush_size = None
+        self.flush_interval = None
+        self.send_buffer = bytearray()
+        self._send_queue = []
+        self._send_deadline = None
+        # scheduler.SendScheduler, messages are sent directly while None
+        self.send_scheduler = None
+        # pool.MessagePool received messages are taken from if set
+        self.message_pool = None
+        # delta.DeltaCompression, compressed frames are not understood
+        # while None
+        self.delta_compression = None
+        # state.StateCache updated with every received message if set
+        self.state_cache = None
         self.buffer = bytearray()
         self.buffer_index = 0
         self.link_stats = dict(bytes_sent=0,
                                packets_sent=0,
                                bytes_received=0,
                                packets_received=0,
-                               receive_errors=0)
+                               receive_errors=0,
+                               packets_filtered=0,
+                               packets_dropped=0)
+        # msg_id indexed table of {node_id or None: [callbacks]}. None while
+        # there are no subscriptions, which disables filtering.
+        self._subscribers = None
+        self.verify_filtered_crc = False
         self.header_unpacker = struct.Struct("<BBB")
         self.crc_unpacker = struct.Struct("<H")
         self.header_len = self.header_unpacker.size
         self.crc_len = self.crc_unpacker.size
         self.min_msg_len = self.crc_len + self.header_len + 2
+        self.max_frame_len = cobs.max_encoded_len(self.header_len + 255 +
+                                                  self.crc_len)
+        self._resync = False
+        # per msg_id buffers to zero pad truncated payloads into
+        self._scratch = {}
+        self._zeros = memoryview(bytes(255))
+        # messages are packed into this buffer before COBS encoding
+        self._pack_buffer = bytearray(msgs.MAX_FRAME_LEN)
+        self._pack_view = memoryview(self._pack_buffer)
 
     def set_send_callback(self, callback, *args, **kwargs):
+        '''Call callback(msg, *args, **kwargs) for every written message.
+
+        msg.get_msg_buffer() and msg.get_payload() return the sent frame
+        then. Without a send callback, send() packs into a buffer of the
+        link and leaves them untouched.
+        '''
         self.send_callback = callback
         self.send_callback_args = args
         self.send_callback_kwargs = kwargs
 
-    def _update_link_stats_sent(self, msg_len):
+    def set_log_writer(self, log_writer):
+        '''Record all sent and received frames with a logfile.LogWriter.
+
+        Pass None to stop recording.
+        '''
+        self.log_writer = log_writer
+
+    def set_send_buffering(self, flush_size, flush_interval=None):
+        '''Coalesce sent messages into fewer port writes.
+
+        Encoded messages are collected in send_buffer and written at once
+        when the next message would exceed flush_size bytes, flush_size is
+        reached, flush_interval seconds passed since the first buffered
+        message (checked on send and flush_if_due) or flush() is called.
+        Link stats and the send callback are updated when a message is
+        actually written. flush_size=None disables buffering.
+        '''
+        if flush_size is None:
+            self.flush()
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+    def set_message_pool(self, pool):
+        '''Decode received messages into instances of a pool.MessagePool.
+
+        Messages returned by recv_msg, feed and decode are then taken from
+        the pool and belong to the caller, who may give them back with
+        pool.release(msg) once done (see MessagePool for the rules).
+        Subscribed callbacks only borrow the message for the duration of
+        the call. Takes precedence over lazy decoding. Pass None to allocate
+        new messages again.
+        '''
+        self.message_pool = pool
+
+    def set_send_scheduler(self, scheduler):
+        '''Queue sent messages in a scheduler.SendScheduler.
+
+        send and send_many hand the messages to the scheduler which writes
+        them according to its priorities and rate limits. Pass None to
+        send directly again, messages still queued are sent first.
+        '''
+        if scheduler is None and self.send_scheduler is not None:
+            self.send_scheduler.drain()
+            self.send_scheduler.link = None
+        if scheduler is not None:
+            scheduler.link = self
+        self.send_scheduler = scheduler
+
+    def set_delta_compression(self, compression):
+        '''Send and receive delta compressed frames with a
+        delta.DeltaCompression.
+
+        Sent messages of the compression's msg_types are written as
+        keyframes and deltas, received compressed frames of any type are
+        rebuilt into normal messages. Both ends need one. Pass None to
+        disable it again.
+        '''
+        self.delta_compression = compression
+
+    def set_state_cache(self, cache):
+        '''Keep the latest received messages in a state.StateCache.
+
+        The cache is updated before subscribed callbacks are called, with
+        the messages that pass subscription filtering. Pass None to stop
+        updating it.
+        '''
+        self.state_cache = cache
+
+    def subscribe(self, msg_id, callback, node_id=None):
+        '''Call callback(msg) for every received message of msg_id.
+
+        msg_id may also be a message class. With node_id given only
+        messages from that node are passed. As long as there is at least one
+        subscription, frames without a matching subscriber are counted as
+        packets_filtered and dropped right after COBS decoding, before the
+        CRC check and payload unpacking. Set verify_filtered_crc to still
+        check their CRC and count invalid ones as receive errors.
+        Subscribed messages are also returned by recv_msg and feed.
+        '''
+        msg_id = getattr(msg_id, "id", msg_id)
+        if self._subscribers is None:
+            self._subscribers = [None] * 256
+        entry = self._subscribers[msg_id]
+        if entry is None:
+            entry = self._subscribers[msg_id] = {}
+        entry.setdefault(node_id, []).append(callback)
+
+    def unsubscribe(self, msg_id, callback, node_id=None):
+        msg_id = getattr(msg_id, "id", msg_id)
+        entry = self._subscribers[msg_id] if self._subscribers else None
+        if entry is None or callback not in entry.get(node_id, []):
+            raise ValueError("Callback is not subscribed.")
+        entry[node_id].remove(callback)
+        if not entry[node_id]:
+            del entry[node_id]
+        if not entry:
+            self._subscribers[msg_id] = None
+        if not any(self._subscribers):
+            self._subscribers = None
+
+    def _filter(self, data):
+        # data is the COBS decoded frame, returns the matching callbacks or
+        # None if the frame has been filtered out
+        msg_id = data[2]
+        if (msg_id == DELTA_MSG_ID and self.delta_compression is not None
+                and len(data) > self.header_len + self.crc_len):
+            # subscriptions are for the compressed message type
+            msg_id = data[self.header_len]
+        entry = self._subscribers[msg_id]
+        if entry is not None:
+            callbacks = entry.get(data[1])
+            subscribed_all = entry.get(None)
+            if callbacks is None:
+                callbacks = subscribed_all
+            elif subscribed_all is not None:
+                callbacks = callbacks + subscribed_all
+            if callbacks is not None:
+                return callbacks
+        self.link_stats["packets_filtered"] += 1
+        if self.stats is not None:
+            self.stats.on_filtered(data[2], data[1], len(data))
+        if self.verify_filtered_crc:
+            if data[2] == DELTA_MSG_ID:
+                crc_extra = DELTA_CRC_EXTRA
+            else:
+                msg_type = msgs.HIPPOLINK_MAP.get(data[2])
+                crc_extra = None if msg_type is None else msg_type.crc_extra
+            crc_len = self.crc_len
+            crc, = self.crc_unpacker.unpack_from(data, len(data) - crc_len)
+            if (crc_extra is None or crc != crc16(memoryview(data)[:-crc_len],
+                                                  crc_extra)):
+                self._update_link_stats_errors(ERROR_CRC, data[2], data[1])
+        return None
+
+    def set_stats(self, stats):
+        '''Collect detailed statistics with a stats.LinkStats.
+
+        Pass None to disable them again.
+        '''
+        self.stats = stats
+
+    def _update_link_stats_sent(self, msg_len, msg_id=None):
         self.link_stats["bytes_sent"] += msg_len
         self.link_stats["packets_sent"] += 1
+        if self.stats is not None:
+            self.stats.on_sent(msg_id, self.node_id, msg_len)
 
-    def _update_link_stats_received(self, msg_len):
+    def _update_link_stats_received(self, msg_len, msg_id=None,
+                                    node_id=None):
         self.link_stats["bytes_received"] += msg_len
         self.link_stats["packets_received"] += 1
+        if self.stats is not None:
+            self.stats.on_received(msg_id, node_id, msg_len)
 
-    def _update_link_stats_errors(self):
+    def _update_link_stats_errors(self, cause=None, msg_id=None,
+                                  node_id=None):
         self.link_stats["receive_errors"] += 1
+        if self.stats is not None:
+            self.stats.on_error(cause, msg_id, node_id)
 
-    def send(self, msg):
-        packed_msg = msg.pack(self)
-        encoded_msg = cobs.encode(packed_msg)
-        self.port.write(encoded_msg)
-        self._update_link_stats_sent(len(encoded_msg))
+    def _pack(self, msg):
+        if self.delta_compression is not None:
+            frame_len = self.delta_compression.pack_into(
+                msg, self._pack_buffer, 0, self.node_id)
+            if frame_len is not None:
+                return frame_len
+        return msg.pack_into(self._pack_buffer, 0, self.node_id)
+
+    def _encode(self, msg):
+        if self.stats is not None and self.stats.timing:
+            start = default_timer()
+            frame_len = self._pack(msg)
+            self.stats.on_encode_time(msg.get_msg_id(),
+                                      default_timer() - start)
+        else:
+            frame_len = self._pack(msg)
+        frame = self._pack_view[:frame_len]
+        if self.log_writer is not None:
+            self.log_writer.write_frame(frame, logfile.SENT)
+        if self.send_callback is not None:
+            # the callback gets the message with its frame, like pack()
+            # leaves it. That is the uncompressed frame for messages sent
+            # delta compressed.
+            if frame[2] == DELTA_MSG_ID and msg.get_msg_id() != DELTA_MSG_ID:
+                encoded_msg = cobs.encode(frame)
+                msg.pack(self)
+                return encoded_msg
+            frame = msg._msg_buffer = bytearray(frame)
+            msg._payload = frame[self.header_len:-self.crc_len]
+        return cobs.encode(frame)
+
+    def _sent(self, msg, encoded_len):
+        self._update_link_stats_sent(encoded_len, msg.get_msg_id())
         if self.send_callback:
             self.send_callback(msg, *self.send_callback_args,
                                **self.send_callback_kwargs)
 
+    def _write_port(self, data):
+        # ports may return False for data they dropped, e.g. a
+        # router.RoutedLink whose buffer is full
+        return self.port.write(data) is not False
+
+    def _queue(self, msg, encoded_msg):
+        encoded_len = len(encoded_msg)
+        if (self.send_buffer
+                and len(self.send_buffer) + encoded_len > self.flush_size):
+            self.flush()
+        if not self.send_buffer and self.flush_interval is not None:
+            self._send_deadline = time.monotonic() + self.flush_interval
+        self.send_buffer += encoded_msg
+        self._send_queue.append((msg, encoded_len))
+        if len(self.send_buffer) >= self.flush_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def _write(self, msg, encoded_msg):
+        if self.flush_size is not None:
+            self._queue(msg, encoded_msg)
+            return
+        if self._write_port(encoded_msg):
+            self._sent(msg, len(encoded_msg))
+        else:
+            self.link_stats["packets_dropped"] += 1
+
+    def send(self, msg):
+        if self.send_scheduler is not None:
+            self.send_scheduler.enqueue(msg)
+            return
+        self._write(msg, self._encode(msg))
+
+    def send_many(self, msgs):
+        '''Send several messages with a single port write.
+
+        In buffered mode the messages are queued like with send(). With a
+        send scheduler they are queued in the scheduler.
+        '''
+        if self.send_scheduler is not None:
+            for msg in msgs:
+                self.send_scheduler.enqueue(msg)
+            return
+        if self.flush_size is not None:
+            for msg in msgs:
+                self._queue(msg, self._encode(msg))
+            return
+        buffer = bytearray()
+        sent = []
+        for msg in msgs:
+            encoded_msg = self._encode(msg)
+            buffer += encoded_msg
+            sent.append((msg, len(encoded_msg)))
+        if buffer and not self._write_port(buffer):
+            self.link_stats["packets_dropped"] += len(sent)
+            return
+        for msg, encoded_len in sent:
+            self._sent(msg, encoded_len)
+
+    def flush(self):
+        '''Write all buffered messages.'''
+        self._send_deadline = None
+        if not self.send_buffer:
+            return
+        written = self._write_port(self.send_buffer)
+        self.send_buffer = bytearray()
+        sent = self._send_queue
+        self._send_queue = []
+        if not written:
+            self.link_stats["packets_dropped"] += len(sent)
+            return
+        for msg, encoded_len in sent:
+            self._sent(msg, encoded_len)
+
+    def flush_if_due(self):
+        '''flush() if the flush_interval of the buffered data has passed.'''
+        if (self._send_deadline is not None
+                and time.monotonic() >= self._send_deadline):
+            self.flush()
+
     def decode(self, msg_buffer):
+        return self._decode_frame(msg_buffer, None)
+
+    def decode_into(self, msg_buffer, msg):
+        '''Decode msg_buffer by overwriting the fields of msg.
+
+        msg has to be an instance of the frame's message type, otherwise
+        HippoLinkError (cause "type") is raised and msg is left untouched.
+        The fields are always unpacked right away, even if lazy is set.
+        Returns msg.
+        '''
+        return self._decode_frame(msg_buffer, msg)
+
+    def _decode_frame(self, msg_buffer, msg):
         header_len = self.header_len
         crc_len = self.crc_len
+        view = memoryview(msg_buffer)
         try:
-            msg_len, node_id, msg_id = self.header_unpacker.unpack(
-                msg_buffer[:header_len])
+            msg_len, node_id, msg_id = self.header_unpacker.unpack_from(view)
         except struct.error as e:
             raise HippoLinkError(
-                "Unable to unpack HippoLink header: {}".format(e))
+                "Unable to unpack HippoLink header: {}".format(e),
+                ERROR_HEADER)
 
-        payload_len = len(msg_buffer) - (header_len + crc_len)
+        payload_len = len(view) - (header_len + crc_len)
         if msg_len != payload_len:
             raise HippoLinkError(
                 "Invalid HippoLink message length(msg_id={}). Got {} but "
-                "expected {}.".format(msg_id, payload_len, msg_len))
-        if msg_id not in msgs.HIPPOLINK_MAP:
-            raise HippoLinkError("Unknown message ID {}".format(msg_id))
+                "expected {}.".format(msg_id, payload_len, msg_len),
+                ERROR_LENGTH)
+        decoder = msgs.HIPPOLINK_DECODERS[msg_id]
+        if decoder is None:
+            if (msg_id == DELTA_MSG_ID
+                    and self.delta_compression is not None):
+                return self._decode_delta(msg_buffer, view, msg)
+            raise HippoLinkError("Unknown message ID {}".format(msg_id),
+                                 ERROR_UNKNOWN_ID)
 
         msg_type = msgs.HIPPOLINK_MAP[msg_id]
-        fmt = msg_type.format
-        order_map = msg_type.orders
-        len_map = msg_type.lengths
         crc_extra = msg_type.crc_extra
 
         try:
-            crc, = self.crc_unpacker.unpack(msg_buffer[-crc_len:])
+            crc, = self.crc_unpacker.unpack_from(view, header_len + msg_len)
         except struct.error as e:
-            raise HippoLinkError("Unable to unpack CRC: {}".format(e))
-        crc_buffer = msg_buffer[:-crc_len]
-        crc_buffer.append(crc_extra)
-        crc_check = x25crc(crc_buffer)
-        if crc != crc_check.crc:
+            raise HippoLinkError("Unable to unpack CRC: {}".format(e),
+                                 ERROR_CRC)
+        crc_check = crc16(view[:-crc_len], crc_extra)
+        if crc != crc_check:
             raise HippoLinkError("Invalid CRC(msg_id={}) is 0x{:04x} but "
                                  "should be 0x{:04x}.".format(
-                                     msg_id, crc, crc_check.crc))
+                                     msg_id, crc, crc_check), ERROR_CRC)
+        if msg is not None and not isinstance(msg, msg_type):
+            raise HippoLinkError(
+                "Cannot decode {} into {} instance.".format(
+                    msg_type.name, msg.get_type()), ERROR_TYPE)
 
         csize = msg_type.unpacker.size
-        payload_buffer = msg_buffer[header_len:-crc_len]
-        if len(payload_buffer) < csize:
-            payload_buffer.extend([0] * (csize - len(payload_buffer)))
-        payload_buffer = payload_buffer[:csize]
+        payload = view[header_len:-crc_len]
+        if msg_len < csize:
+            # trailing zeros have been truncated by the sender
+            payload_buffer = self._scratch.get(msg_id)
+            if payload_buffer is None:
+                payload_buffer = bytearray(csize)
+                self._scratch[msg_id] = payload_buffer
+            payload_buffer[:msg_len] = payload
+            payload_buffer[msg_len:] = self._zeros[msg_len:csize]
+            if self.numpy_arrays:
+                # arrays would be views on the reused scratch buffer
+                payload_buffer = bytearray(payload_buffer)
+        else:
+            payload_buffer = payload
         try:
-            fields = msg_type.unpacker.unpack(payload_buffer)
+            if msg is not None:
+                msg._unpack_into(payload_buffer, self.numpy_arrays)
+                msg._lazy_payload = None
+            elif self.message_pool is not None:
+                msg = self.message_pool.acquire(msg_type)
+                msg._unpack_into(payload_buffer, self.numpy_arrays)
+            elif self.lazy:
+                # copy, the scratch buffer is reused
+                msg = msg_type._decode_lazy(bytes(payload_buffer))
+            elif self.numpy_arrays:
+                msg = decoder(payload_buffer, True)
+            else:
+                msg = decoder(payload_buffer)
         except struct.error as e:
             raise HippoLinkError("Unable to unpack payload (type={}, "
                                  "fmt={}, payload_len={}): {}".format(
-                                     msg_type, fmt, len(payload_buffer), e))
-
-        fieldlist = list(fields)
-        fields = fieldlist[:]
-        if sum(len_map) == len(len_map):
-            # message has no arrays
-            for i in range(len(fieldlist)):
-                fieldlist[i] = fields[order_map[i]]
-        else:
-            fieldlist = []
-            for i in range(len(order_map)):
-                order = order_map[i]
-                L = len_map[order]
-                tip = sum(len_map[:order])
-                field = fields[tip]
-                if L == 1 or isinstance(field, str):
-                    fieldlist.append(field)
-                else:
-                    fieldlist.append(fields[tip:tip + L])
-
-        # TODO: handle strings
-
-        fields = tuple(fieldlist)
+                                     msg_type, msg_type.format,
+                                     len(payload_buffer), e), ERROR_PAYLOAD)
+        except Exception as e:
+            raise HippoLinkError(
+                "Unable to instantiate HippoLink message: {}".format(e),
+                ERROR_INSTANTIATE)
+        msg._msg_len = msg_len
+        msg._node_id = node_id
+        msg._crc = crc
+        if self.keep_buffers:
+            if self.zero_copy:
+                msg._msg_buffer = view
+                msg._payload = payload
+            else:
+                msg._msg_buffer = msg_buffer
+                msg._payload = msg_buffer[header_len:-crc_len]
+        return msg
+
+    def _decode_delta(self, msg_buffer, view, msg):
+        # header and length have been checked by _decode_frame
+        header_len = self.header_len
+        crc_len = self.crc_len
+        node_id = view[1]
+        try:
+            crc, = self.crc_unpacker.unpack_from(view, len(view) - crc_len)
+        except struct.error as e:
+            raise HippoLinkError("Unable to unpack CRC: {}".format(e),
+                                 ERROR_CRC)
+        crc_check = crc16(view[:-crc_len], DELTA_CRC_EXTRA)
+        if crc != crc_check:
+            raise HippoLinkError("Invalid CRC(msg_id={}) is 0x{:04x} but "
+                                 "should be 0x{:04x}.".format(
+                                     DELTA_MSG_ID, crc, crc_check),
+                                 ERROR_CRC)
+        payload = view[header_len:-crc_len]
+        try:
+            msg_type, payload_buffer = \
+                self.delta_compression.decode_payload(node_id, payload)
+        except KeyError as e:
+            raise HippoLinkError("Unknown message ID {}".format(e),
+                                 ERROR_UNKNOWN_ID)
+        except ValueError as e:
+            raise HippoLinkError(str(e), ERROR_DELTA)
+        if msg is not None and not isinstance(msg, msg_type):
+            raise HippoLinkError(
+                "Cannot decode {} into {} instance.".format(
+                    msg_type.name, msg.get_type()), ERROR_TYPE)
         try:
-            msg = msg_type(*fields)
+            if msg is not None:
+                msg._unpack_into(payload_buffer, self.numpy_arrays)
+                msg._lazy_payload = None
+            elif self.message_pool is not None:
+                msg = self.message_pool.acquire(msg_type)
+                msg._unpack_into(payload_buffer, self.numpy_arrays)
+            elif self.lazy:
+                msg = msg_type._decode_lazy(payload_buffer)
+            else:
+                msg = msg_type._decode(payload_buffer)
         except Exception as e:
-            raise HippoLinkError("Unable to instantiate HippoLink message: "
-                                 "{}".format(e))
-        msg._msg_buffer = msg_buffer
-        msg._payload = msg_buffer[header_len:-crc_len]
+            raise HippoLinkError(
+                "Unable to instantiate HippoLink message: {}".format(e),
+                ERROR_INSTANTIATE)
+        msg._msg_len = len(payload)
+        msg._node_id = node_id
         msg._crc = crc
-        msg._header = msgs.HippoLinkHeader(msg_id=msg_id,
-                                           msg_len=msg_len,
-                                           node_id=node_id)
+        if self.keep_buffers:
+            # the frame as received, the payload as rebuilt
+            msg._msg_buffer = view if self.zero_copy else msg_buffer
+            msg._payload = payload_buffer
         return msg
 
-    def recv_msg(self):
-        data = self.port.read_until(expected=bytearray([0, ]))
+    def decode_batch(self, frames):
+        '''Decode many COBS-decoded frames into numpy structured arrays.
+
+        See batch.decode_batch. Requires numpy.
+        '''
+        return batch.decode_batch(frames, self)
+
+    def _parse_frame(self, data):
         if not data or data[-1] != 0 or len(data) < self.min_msg_len:
             return None
         data = cobs.decode(data)
         if len(data) < self.header_len + self.crc_len:
-            self._update_link_stats_errors()
+            self._update_link_stats_errors(ERROR_SHORT)
             msg = HippoLink_bad_data(bytearray(data),
                                      "Message shorter than overhead.")
             return msg
+        callbacks = None
+        if self._subscribers is not None:
+            callbacks = self._filter(data)
+            if callbacks is None:
+                return None
+        stats = self.stats
         try:
-            msg = self.decode(data)
+            if stats is not None and stats.timing:
+                start = default_timer()
+                msg = self.decode(data)
+                stats.on_decode_time(data[2], default_timer() - start)
+            else:
+                msg = self.decode(data)
         except HippoLinkError as e:
             msg = HippoLink_bad_data(data, e.message)
-            self._update_link_stats_errors()
-        else:
-            self._update_link_stats_received(len(msg._msg_buffer))
+            self._update_link_stats_errors(e.cause, data[2], data[1])
+            return msg
+        self._update_link_stats_received(len(data), data[2], data[1])
+        if self.log_writer is not None:
+            self.log_writer.write_frame(data, logfile.RECEIVED)
+        if self.state_cache is not None:
+            self.state_cache.update(msg)
+        if callbacks is not None:
+            for callback in callbacks:
+                callback(msg)
         return msg
+
+    def recv_msg(self):
+        data = self.port.read_until(expected=bytearray([0, ]))
+        return self._parse_frame(data)
+
+    def split_frames(self, data):
+        '''Push received bytes and return the completed COBS encoded frames.
+
+        Incomplete frames are kept in self.buffer until a later call
+        delivers their delimiter. If no delimiter shows up within
+        max_frame_len bytes the buffered data is dropped and everything up
+        to the next zero delimiter is discarded as a receive error.
+        '''
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        start = 0
+        end = buffer.find(0, self.buffer_index)
+        while end >= 0:
+            if self._resync:
+                self._resync = False
+                self._update_link_stats_errors(ERROR_FRAMING)
+            else:
+                frames.append(buffer[start:end + 1])
+            start = end + 1
+            end = buffer.find(0, start)
+        del buffer[:start]
+        if len(buffer) > self.max_frame_len:
+            del buffer[:]
+            self._resync = True
+        self.buffer_index = len(buffer)
+        return frames
+
+    def feed(self, data):
+        '''Push received bytes of arbitrary length into the link.
+
+        Returns a list of the messages completed by data, in stream order.
+        Framing works like split_frames.
+        '''
+        messages = []
+        for frame in self.split_frames(data):
+            msg = self._parse_frame(frame)
+            if msg is not None:
+                messages.append(msg)
+        return messages
@@ -0,0 +1,317 @@
+import bisect
+import mmap
+import struct
+import time
+
+from . import cobs
+from .delta import DeltaCompression, DELTA_MSG_ID
+from .msgs import HEADER_LEN, CRC_LEN
+
+# file layout:
+#   file header | records ... | index entries ... | trailer
+# A record is a record header followed by the raw (COBS-decoded) frame.
+# The index and trailer are written on close. Files without them (e.g. the
+# writer crashed) are indexed by scanning the record headers on open.
+FILE_MAGIC = b"HLOG"
+INDEX_MAGIC = b"HIDX"
+VERSION = 1
+SENT = 0
+RECEIVED = 1
+
+_file_header = struct.Struct("<4sB3x")
+# timestamp, direction, frame length
+_record_header = struct.Struct("<dBH")
+# timestamp, record offset, msg_id, node_id
+_index_entry = struct.Struct("<dQBB")
+# index offset, number of entries, magic
+_trailer = struct.Struct("<QQ4s")
+
+
+class LogError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+        self.message = msg
+
+
+class LogWriter(object):
+    '''Records timestamped raw frames and writes an index on close.
+
+    Attach it to a link with HippoLink.set_log_writer to record everything
+    sent and received on that link.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(_file_header.pack(FILE_MAGIC, VERSION))
+        self._offset = _file_header.size
+        self._index = bytearray()
+        self._count = 0
+        self._last_timestamp = 0.0
+
+    def write_frame(self, frame, direction=RECEIVED, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        # the index is searched with bisect, so keep it sorted
+        if timestamp < self._last_timestamp:
+            timestamp = self._last_timestamp
+        self._last_timestamp = timestamp
+        frame_len = len(frame)
+        self._file.write(_record_header.pack(timestamp, direction, frame_len))
+        self._file.write(frame)
+        msg_id = frame[2] if frame_len >= 3 else 0
+        node_id = frame[1] if frame_len >= 3 else 0
+        self._index += _index_entry.pack(timestamp, self._offset, msg_id,
+                                         node_id)
+        self._offset += _record_header.size + frame_len
+        self._count += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.write(self._index)
+        self._file.write(_trailer.pack(self._offset, self._count,
+                                       INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Index(object):
+    def __init__(self):
+        self.timestamps = []
+        self.offsets = []
+
+    def append(self, timestamp, offset):
+        self.timestamps.append(timestamp)
+        self.offsets.append(offset)
+
+    def offsets_between(self, start=None, end=None):
+        first = 0
+        last = len(self.timestamps)
+        if start is not None:
+            first = bisect.bisect_left(self.timestamps, start)
+        if end is not None:
+            last = bisect.bisect_right(self.timestamps, end)
+        return self.offsets[first:last]
+
+
+class LogReader(object):
+    '''Memory-maps a log file for random access through its index.'''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise LogError("Unable to map log file: {}".format(e))
+        self._view = memoryview(self._mmap)
+        if len(self._view) < _file_header.size:
+            self.close()
+            raise LogError("Not a HippoLink log file: {}".format(path))
+        magic, version = _file_header.unpack_from(self._view)
+        if magic != FILE_MAGIC:
+            self.close()
+            raise LogError("Not a HippoLink log file: {}".format(path))
+        self.version = version
+        self._all = _Index()
+        self._by_msg_id = {}
+        self._by_node_id = {}
+        if not self._load_index():
+            self._scan_index()
+
+    def _add(self, timestamp, offset, msg_id, node_id):
+        self._all.append(timestamp, offset)
+        index = self._by_msg_id.get(msg_id)
+        if index is None:
+            index = self._by_msg_id[msg_id] = _Index()
+        index.append(timestamp, offset)
+        index = self._by_node_id.get(node_id)
+        if index is None:
+            index = self._by_node_id[node_id] = _Index()
+        index.append(timestamp, offset)
+
+    def _load_index(self):
+        size = len(self._view)
+        if size < _file_header.size + _trailer.size:
+            return False
+        index_offset, count, magic = _trailer.unpack_from(
+            self._view, size - _trailer.size)
+        index_end = index_offset + count * _index_entry.size
+        if magic != INDEX_MAGIC or index_end != size - _trailer.size:
+            return False
+        for entry in _index_entry.iter_unpack(
+                self._view[index_offset:index_end]):
+            self._add(*entry)
+        return True
+
+    def _scan_index(self):
+        view = self._view
+        offset = _file_header.size
+        size = len(view)
+        last_timestamp = 0.0
+        while offset + _record_header.size <= size:
+            timestamp, direction, frame_len = _record_header.unpack_from(
+                view, offset)
+            start = offset + _record_header.size
+            if start + frame_len > size:
+                # incomplete last record
+                break
+            msg_len = frame_len - HEADER_LEN - CRC_LEN
+            if (direction not in (SENT, RECEIVED)
+                    or timestamp < last_timestamp
+                    or (frame_len >= HEADER_LEN and view[start] != msg_len)):
+                # no record, e.g. the start of an index whose writing was
+                # interrupted
+                break
+            last_timestamp = timestamp
+            if frame_len >= 3:
+                self._add(timestamp, offset, view[start + 2],
+                          view[start + 1])
+            else:
+                self._add(timestamp, offset, 0, 0)
+            offset = start + frame_len
+
+    def __len__(self):
+        return len(self._all.offsets)
+
+    def msg_ids(self):
+        return sorted(self._by_msg_id)
+
+    def read_record(self, offset):
+        '''(timestamp, direction, frame) of the record at offset.
+
+        frame is a memoryview into the mapped file.
+        '''
+        timestamp, direction, frame_len = _record_header.unpack_from(
+            self._view, offset)
+        start = offset + _record_header.size
+        return timestamp, direction, self._view[start:start + frame_len]
+
+    def _offsets(self, msg_id, node_id, start, end):
+        if msg_id is None and node_id is None:
+            return self._all.offsets_between(start, end)
+        if msg_id is None:
+            index = self._by_node_id.get(node_id)
+            return index.offsets_between(start, end) if index else []
+        index = self._by_msg_id.get(msg_id)
+        if index is None:
+            return []
+        offsets = index.offsets_between(start, end)
+        if node_id is None:
+            return offsets
+        node_offsets = set(
+            self._by_node_id.get(node_id, _Index()).offsets_between(
+                start, end))
+        return [offset for offset in offsets if offset in node_offsets]
+
+    def frames(self, msg_id=None, start=None, end=None, node_id=None,
+               direction=None):
+        '''Iterate (timestamp, direction, frame) of the matching records.
+
+        msg_id may also be a message class. start and end are inclusive
+        timestamps. Only the matching records are touched.
+        '''
+        msg_id = getattr(msg_id, "id", msg_id)
+        for offset in self._offsets(msg_id, node_id, start, end):
+            record = self.read_record(offset)
+            if direction is None or record[1] == direction:
+                yield record
+
+    def messages(self, msg_id=None, start=None, end=None, node_id=None,
+                 direction=None, link=None):
+        '''Iterate (timestamp, message) of the matching records.
+
+        Delta compressed frames (see delta.DeltaCompression) are rebuilt
+        with one decoder state per direction, fed with all compressed
+        records from the start of the log, and are matched by the msg_id
+        of the message they carry. A link passed in decodes all records
+        instead and has to bring its own delta compression.
+        '''
+        msg_id = getattr(msg_id, "id", msg_id)
+        if link is not None or DELTA_MSG_ID not in self._by_msg_id:
+            if link is None:
+                link = self._delta_link()
+            for timestamp, _, frame in self.frames(msg_id, start, end,
+                                                   node_id, direction):
+                yield timestamp, link.decode(bytearray(frame))
+            return
+        from .hippolink import HippoLinkError
+        links = {}
+        for offset in self._offsets(None, node_id, None, end):
+            timestamp, record_direction, frame = self.read_record(offset)
+            if direction is not None and record_direction != direction:
+                continue
+            in_range = start is None or timestamp >= start
+            compressed = len(frame) >= 3 and frame[2] == DELTA_MSG_ID
+            if not compressed and not (in_range and (
+                    msg_id is None or len(frame) >= 3 and frame[2] == msg_id)):
+                continue
+            link = links.get(record_direction)
+            if link is None:
+                link = links[record_direction] = self._delta_link()
+            if not compressed:
+                yield timestamp, link.decode(bytearray(frame))
+                continue
+            # every compressed record updates the decoder state
+            try:
+                msg = link.decode(bytearray(frame))
+            except HippoLinkError:
+                if in_range:
+                    raise
+                continue
+            if in_range and msg_id in (None, DELTA_MSG_ID, msg.get_msg_id()):
+                yield timestamp, msg
+
+    def _delta_link(self):
+        from .hippolink import HippoLink
+        link = HippoLink(None, 0)
+        link.set_delta_compression(DeltaCompression())
+        return link
+
+    def replay(self, link, speed=1.0, msg_id=None, start=None, end=None,
+               node_id=None, direction=RECEIVED):
+        '''Feed the matching frames into link and yield the messages.
+
+        speed scales the recorded timing, e.g. 2.0 replays twice as fast.
+        speed=None replays without any delay.
+        '''
+        t_first = None
+        t_wall = None
+        for timestamp, _, frame in self.frames(msg_id, start, end, node_id,
+                                               direction):
+            if speed:
+                if t_first is None:
+                    t_first = timestamp
+                    t_wall = time.monotonic()
+                delay = (timestamp - t_first) / speed - (time.monotonic() -
+                                                         t_wall)
+                if delay > 0:
+                    time.sleep(delay)
+            for msg in link.feed(cobs.encode(frame)):
+                yield msg
+
+    def close(self):
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                # frames handed out are still referenced, the mapping is
+                # released together with them
+                pass
+            self._view = None
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
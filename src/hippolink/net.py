@@ -0,0 +1,341 @@
+# UDP and TCP ports for HippoLink. Both provide the read_until/write
+# interface of a pyserial port, so HippoLink(port, node_id) works as with a
+# serial device. Remote ends are learned from the node_id in the headers of
+# the frames they send, write(data, node_id) addresses a single one.
+import collections
+import selectors
+import socket
+import time
+
+from .hippolink import HippoLink
+from .router import peek_header
+
+# 1500 byte Ethernet MTU minus IPv4 and UDP headers
+UDP_MAX_DATAGRAM = 1472
+DEFAULT_MAX_BUFFER = 1024 * 1024
+
+
+def split_datagrams(data, max_size):
+    '''Cut COBS encoded frames into chunks of at most max_size bytes.
+
+    Chunks end on frame boundaries, a single frame larger than max_size
+    gets a chunk of its own.
+    '''
+    chunks = []
+    start = 0
+    size = len(data)
+    while start < size:
+        if size - start <= max_size:
+            chunks.append(data[start:])
+            break
+        end = data.rfind(b"\x00", start, start + max_size)
+        if end < 0:
+            end = data.find(b"\x00", start + max_size)
+            if end < 0:
+                end = size - 1
+        chunks.append(data[start:end + 1])
+        start = end + 1
+    return chunks
+
+
+class _Port(object):
+    def __init__(self, timeout):
+        # seconds read_until waits for data, None blocks, 0 never waits
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        # node_id -> remote end, learned from received frames
+        self.peers = {}
+        self._frames = collections.deque()
+
+    def _learn(self, frame, peer):
+        header = peek_header(frame)
+        if header is not None:
+            self.peers[header[1]] = peer
+
+    def read_until(self, expected=b"\x00"):
+        '''Next received COBS encoded frame.
+
+        Returns an empty bytes object if none arrived within timeout.
+        Only the zero delimiter is supported as expected.
+        '''
+        timeout = self.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._frames:
+            self.poll(timeout)
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+        if self._frames:
+            return self._frames.popleft()
+        return b""
+
+    def read_frames(self, timeout=0):
+        '''All frames received so far, waiting up to timeout for some.'''
+        if not self._frames:
+            self.poll(timeout)
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+    def poll(self, timeout=0):
+        '''Wait up to timeout seconds for I/O once and handle it.'''
+        for key, events in self.selector.select(timeout):
+            key.data(events)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class UdpPort(_Port):
+    '''HippoLink port on a UDP socket.
+
+    Every write is sent to all peers (or only to the one of node_id) in
+    datagrams of up to max_datagram bytes, each carrying as many complete
+    frames as fit. Use HippoLink.set_send_buffering(port.max_datagram,
+    flush_interval) to batch sent messages into full datagrams. Addresses
+    added with add_peer are sent to until the node_id of the remote end is
+    known. Datagrams that cannot be sent right away (the socket would
+    block, the datagram is too large, ...) are dropped and counted in
+    stats.
+    '''
+    def __init__(self, local_addr=("0.0.0.0", 0), peers=(),
+                 max_datagram=UDP_MAX_DATAGRAM, timeout=None,
+                 family=socket.AF_INET):
+        _Port.__init__(self, timeout)
+        self.max_datagram = max_datagram
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.bind(local_addr)
+        self.sock.setblocking(False)
+        self.local_addr = self.sock.getsockname()
+        # addresses whose node_id is not known yet
+        self._unnamed = set()
+        self.stats = dict(datagrams_sent=0,
+                          datagrams_received=0,
+                          datagrams_dropped=0,
+                          bytes_discarded=0)
+        for addr in peers:
+            self.add_peer(addr)
+        self.selector.register(self.sock, selectors.EVENT_READ,
+                               self._handle_events)
+
+    def add_peer(self, addr, node_id=None):
+        if node_id is None:
+            self._unnamed.add(addr)
+        else:
+            self.peers[node_id] = addr
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _learn(self, frame, peer):
+        _Port._learn(self, frame, peer)
+        self._unnamed.discard(peer)
+
+    def write(self, data, node_id=None):
+        if node_id is not None:
+            addrs = (self.peers[node_id], )
+        else:
+            addrs = set(self.peers.values())
+            addrs.update(self._unnamed)
+        # returns False if nothing could be sent, see HippoLink._write_port
+        sent = not addrs
+        for chunk in split_datagrams(data, self.max_datagram):
+            for addr in addrs:
+                try:
+                    self.sock.sendto(chunk, addr)
+                except OSError:
+                    self.stats["datagrams_dropped"] += 1
+                    continue
+                self.stats["datagrams_sent"] += 1
+                sent = True
+        return sent
+
+    def _handle_events(self, events):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionRefusedError:
+                # ICMP port unreachable for an earlier datagram
+                continue
+            self.stats["datagrams_received"] += 1
+            # datagrams carry complete frames only
+            start = 0
+            end = data.find(b"\x00")
+            while end >= 0:
+                frame = data[start:end + 1]
+                self._learn(frame, addr)
+                self._frames.append(frame)
+                start = end + 1
+                end = data.find(b"\x00", start)
+            self.stats["bytes_discarded"] += len(data) - start
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.selector.close()
+        self.sock.close()
+        self.sock = None
+
+
+class _Connection(object):
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        sock.setblocking(False)
+        # only used for its streaming framer
+        self.framer = HippoLink(None, 0)
+        self.out_buffer = bytearray()
+
+
+class TcpPort(_Port):
+    '''HippoLink port on any number of TCP connections.
+
+    Open connections with connect(addr) or accept them with listen(addr).
+    Received data is buffered and framed per connection like
+    HippoLink.split_frames does it. Every write goes to all connections
+    (or only to the one node_id was received from). Sockets never block,
+    what cannot be written right away is buffered per connection (up to
+    max_buffer bytes, frames that do not fit anymore are dropped and
+    counted in stats) and sent from poll() or flush(). Closed connections
+    are dropped together with their peers.
+    '''
+    def __init__(self, timeout=None, read_size=4096,
+                 max_buffer=DEFAULT_MAX_BUFFER):
+        _Port.__init__(self, timeout)
+        self.read_size = read_size
+        self.max_buffer = max_buffer
+        self.connections = []
+        self._listeners = []
+        self.stats = dict(connections_opened=0, connections_closed=0,
+                          frames_dropped=0)
+
+    def listen(self, addr=("0.0.0.0", 0), backlog=5):
+        '''Accept connections on addr, returns the bound address.'''
+        sock = socket.create_server(addr, backlog=backlog)
+        sock.setblocking(False)
+        self._listeners.append(sock)
+        self.selector.register(sock, selectors.EVENT_READ,
+                               lambda events: self._accept(sock))
+        return sock.getsockname()
+
+    def connect(self, addr, timeout=None):
+        '''Connection to addr, an existing one is reused.'''
+        for connection in self.connections:
+            if connection.addr == addr:
+                return connection
+        sock = socket.create_connection(addr, timeout)
+        return self._add_connection(sock, addr)
+
+    def _add_connection(self, sock, addr):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = _Connection(sock, addr)
+        self.connections.append(connection)
+        self.selector.register(
+            sock, selectors.EVENT_READ,
+            lambda events: self._handle_events(connection, events))
+        self.stats["connections_opened"] += 1
+        return connection
+
+    def _accept(self, listener):
+        try:
+            sock, addr = listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        self._add_connection(sock, addr)
+
+    def _close_connection(self, connection):
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+        self.connections.remove(connection)
+        for node_id, peer in list(self.peers.items()):
+            if peer is connection:
+                del self.peers[node_id]
+        self.stats["connections_closed"] += 1
+
+    def _update_events(self, connection):
+        events = selectors.EVENT_READ
+        if connection.out_buffer:
+            events |= selectors.EVENT_WRITE
+        key = self.selector.get_key(connection.sock)
+        if key.events != events:
+            self.selector.modify(connection.sock, events, key.data)
+
+    def _send(self, connection):
+        try:
+            n = connection.sock.send(connection.out_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close_connection(connection)
+            return
+        del connection.out_buffer[:n]
+        self._update_events(connection)
+
+    def _handle_events(self, connection, events):
+        if events & selectors.EVENT_WRITE:
+            self._send(connection)
+            if connection not in self.connections:
+                return
+        if not events & selectors.EVENT_READ:
+            return
+        try:
+            data = connection.sock.recv(self.read_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            # end of stream
+            self._close_connection(connection)
+            return
+        for frame in connection.framer.split_frames(data):
+            self._learn(frame, connection)
+            self._frames.append(frame)
+
+    def write(self, data, node_id=None):
+        if node_id is not None:
+            connections = (self.peers[node_id], )
+        else:
+            connections = list(self.connections)
+        # data holds complete frames and is dropped as a whole, so a
+        # buffer never ends in a partial frame. Returns False if no
+        # connection took it, see HippoLink._write_port.
+        written = not connections
+        for connection in connections:
+            if len(connection.out_buffer) + len(data) > self.max_buffer:
+                self._send(connection)
+                if connection not in self.connections:
+                    continue
+                if len(connection.out_buffer) + len(data) > self.max_buffer:
+                    self.stats["frames_dropped"] += data.count(b"\x00")
+                    continue
+            connection.out_buffer += data
+            self._send(connection)
+            written = written or connection in self.connections
+        return written
+
+    def flush(self, timeout=None):
+        '''Wait until all buffered data is written, False on timeout.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(connection.out_buffer
+                  for connection in self.connections):
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    return False
+            self.poll(timeout)
+        return True
+
+    def close(self):
+        for connection in list(self.connections):
+            self._close_connection(connection)
+        for sock in self._listeners:
+            sock.close()
+        self._listeners = []
+        self.selector.close()
@@ -0,0 +1,72 @@
+from . import msgs
+
+
+class MessagePool(object):
+    '''Per message type free lists of message instances.
+
+    Use with HippoLink.set_message_pool or acquire instances directly for
+    HippoLink.decode_into. Ownership rules:
+
+    - A message returned by acquire (or received on a link using the pool)
+      belongs to the caller. The pool keeps no reference to it and never
+      hands it out again while it is owned.
+    - release(msg) gives it back. Afterwards the caller must not use or
+      keep any reference to it, the next acquire overwrites its fields.
+      Releasing a message that is already in the pool raises ValueError.
+    - Messages that are never released are simply garbage collected.
+
+    At most max_size instances per type are kept, further releases are
+    discarded.
+    '''
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        # msg_id -> list of free instances
+        self._free = {}
+        # id() of every instance in a free list, to catch double releases
+        self._free_ids = set()
+        self.stats = dict(created=0, reused=0, released=0, discarded=0)
+
+    def acquire(self, msg_type):
+        '''An instance of msg_type whose fields are to be overwritten.
+
+        Newly created instances have no field values until they are
+        decoded into.
+        '''
+        free = self._free.get(msg_type.id)
+        if free:
+            msg = free.pop()
+            self._free_ids.discard(id(msg))
+            self.stats["reused"] += 1
+            return msg
+        msg = msg_type.__new__(msg_type)
+        msgs.HippoLinkMessage.__init__(msg, msg_type.id)
+        self.stats["created"] += 1
+        return msg
+
+    def release(self, msg):
+        if id(msg) in self._free_ids:
+            raise ValueError("Message has already been released.")
+        msg_id = msg.get_msg_id()
+        if msg_id not in msgs.HIPPOLINK_REGISTRY:
+            # e.g. HippoLink_bad_data
+            return
+        # drop the references to received buffers
+        msg._msg_buffer = None
+        msg._payload = None
+        msg._lazy_payload = None
+        free = self._free.get(msg_id)
+        if free is None:
+            free = self._free[msg_id] = []
+        if len(free) >= self.max_size:
+            self.stats["discarded"] += 1
+            return
+        free.append(msg)
+        self._free_ids.add(id(msg))
+        self.stats["released"] += 1
+
+    def __len__(self):
+        return len(self._free_ids)
+
+    def clear(self):
+        self._free.clear()
+        self._free_ids.clear()
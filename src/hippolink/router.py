@@ -0,0 +1,231 @@
+import os
+import selectors
+
+from . import cobs
+from .hippolink import HippoLink
+
+DEFAULT_MAX_BUFFER = 1024 * 1024
+
+
+def peek_header(frame):
+    '''(msg_len, node_id, msg_id) of a COBS encoded frame.
+
+    Only the first bytes of the frame are decoded, the payload is not
+    touched.
+    '''
+    # decoded byte i is encoded byte i + 1, two extra bytes make sure an
+    # implied zero at the end of the header is decoded as well.
+    header = cobs.decode(frame[:6])
+    if len(header) < 3:
+        return None
+    return header[0], header[1], header[2]
+
+
+class RoutedLink(object):
+    '''A port owned by a HippoLinkRouter.
+
+    port is a file descriptor or anything with fileno(), e.g. a socket or
+    a pyserial port. It is switched to non-blocking mode and accessed via
+    os.read/os.write, and closed when the link is removed. Data that
+    cannot be written right away is buffered up to max_buffer bytes, frames
+    that do not fit anymore are dropped and counted in
+    stats["frames_overflowed"]. A failed write (e.g. the peer closed the
+    connection) removes the link like end of stream does.
+    '''
+    def __init__(self, name, port, node_id, deliver=True, read_size=4096,
+                 max_buffer=DEFAULT_MAX_BUFFER):
+        self.name = name
+        self.port = port
+        self.fd = port if isinstance(port, int) else port.fileno()
+        os.set_blocking(self.fd, False)
+        self.link = HippoLink(self, node_id)
+        # decode received frames and hand them to the application
+        self.deliver = deliver
+        self.read_size = read_size
+        self.max_buffer = max_buffer
+        self.routes = []
+        self.out_buffer = bytearray()
+        # OSError of a failed write, the router removes the link then
+        self.write_error = None
+        self.stats = dict(frames_forwarded_in=0,
+                          bytes_forwarded_in=0,
+                          frames_forwarded_out=0,
+                          bytes_forwarded_out=0,
+                          frames_dropped=0,
+                          frames_overflowed=0)
+
+    def write(self, data):
+        # used as port by self.link, the router flushes the remainder when
+        # the descriptor becomes writable. data holds complete frames, it
+        # is dropped as a whole so the buffer never ends in a partial one.
+        # Returns False if it was dropped.
+        if self.write_error is not None:
+            return False
+        if len(self.out_buffer) + len(data) > self.max_buffer:
+            self.flush()
+            if len(self.out_buffer) + len(data) > self.max_buffer:
+                self.stats["frames_overflowed"] += data.count(b"\x00")
+                return False
+        self.out_buffer += data
+        self.flush()
+        return self.write_error is None
+
+    def flush(self):
+        if not self.out_buffer:
+            return
+        try:
+            n = os.write(self.fd, self.out_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.write_error = e
+            del self.out_buffer[:]
+            return
+        del self.out_buffer[:n]
+
+    def close(self):
+        if isinstance(self.port, int):
+            os.close(self.port)
+        else:
+            self.port.close()
+
+
+class HippoLinkRouter(object):
+    '''Multiplexes several ports with selectors in a single loop.
+
+    Frames are forwarded between links according to the routes added with
+    add_route. Forwarding only peeks at the header, the COBS encoded frame
+    is written unchanged (no re-packing, no CRC recomputation). Frames of
+    links with deliver=True are decoded with HippoLink.decode and returned
+    by poll().
+    '''
+    def __init__(self, selector=None):
+        self.selector = selector or selectors.DefaultSelector()
+        self.links = {}
+
+    def add_link(self, name, port, node_id, deliver=True, read_size=4096,
+                 max_buffer=DEFAULT_MAX_BUFFER):
+        if name in self.links:
+            raise ValueError("Link '{}' already exists.".format(name))
+        routed = RoutedLink(name, port, node_id, deliver, read_size,
+                            max_buffer)
+        self.links[name] = routed
+        self.selector.register(routed.fd, selectors.EVENT_READ, routed)
+        return routed
+
+    def remove_link(self, name):
+        '''Remove the link and its routes and close its port.
+
+        Links are removed as well when their port reaches end of stream.
+        '''
+        routed = self.links.pop(name)
+        self.selector.unregister(routed.fd)
+        for other in self.links.values():
+            other.routes = [(dst, node_ids) for dst, node_ids in other.routes
+                            if dst is not routed]
+        routed.close()
+        return routed
+
+    def add_route(self, src, dst, node_ids=None):
+        '''Forward frames received on src to dst.
+
+        If node_ids is given, only frames whose header node_id is in
+        node_ids are forwarded.
+        '''
+        if node_ids is not None:
+            node_ids = frozenset(node_ids)
+        self.links[src].routes.append((self.links[dst], node_ids))
+
+    def send(self, name, msg):
+        routed = self.links[name]
+        routed.link.send(msg)
+        self._written(routed)
+
+    def link_stats(self, name):
+        '''HippoLink link stats merged with the forwarding stats.'''
+        routed = self.links[name]
+        stats = dict(routed.link.link_stats)
+        stats.update(routed.stats)
+        return stats
+
+    def _written(self, routed):
+        if routed.write_error is not None:
+            # handled like end of stream
+            if self.links.get(routed.name) is routed:
+                self.remove_link(routed.name)
+            return
+        self._update_events(routed)
+
+    def _update_events(self, routed):
+        events = selectors.EVENT_READ
+        if routed.out_buffer:
+            events |= selectors.EVENT_WRITE
+        if self.selector.get_key(routed.fd).events != events:
+            self.selector.modify(routed.fd, events, routed)
+
+    def _forward(self, routed, frame):
+        if not routed.routes:
+            return
+        header = peek_header(frame)
+        if header is None:
+            return
+        node_id = header[1]
+        forwarded = False
+        for dst, node_ids in routed.routes:
+            if node_ids is not None and node_id not in node_ids:
+                continue
+            if not dst.write(frame):
+                self._written(dst)
+                continue
+            dst.stats["frames_forwarded_out"] += 1
+            dst.stats["bytes_forwarded_out"] += len(frame)
+            self._written(dst)
+            forwarded = True
+        if forwarded:
+            routed.stats["frames_forwarded_in"] += 1
+            routed.stats["bytes_forwarded_in"] += len(frame)
+
+    def _read(self, routed, received):
+        try:
+            data = os.read(routed.fd, routed.read_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            # end of stream
+            self.remove_link(routed.name)
+            return
+        for frame in routed.link.split_frames(data):
+            if len(frame) < routed.link.min_msg_len:
+                routed.stats["frames_dropped"] += 1
+                continue
+            self._forward(routed, frame)
+            if routed.deliver:
+                msg = routed.link._parse_frame(frame)
+                if msg is not None:
+                    received.append((routed.name, msg))
+
+    def poll(self, timeout=None):
+        '''Wait for I/O once and handle it.
+
+        Returns a list of (link name, message) for the decoded messages.
+        '''
+        received = []
+        for key, events in self.selector.select(timeout):
+            routed = key.data
+            if self.links.get(routed.name) is not routed:
+                # removed while handling an earlier event
+                continue
+            if events & selectors.EVENT_WRITE:
+                routed.flush()
+                self._written(routed)
+            if (events & selectors.EVENT_READ
+                    and self.links.get(routed.name) is routed):
+                self._read(routed, received)
+        return received
+
+    def close(self):
+        for name in list(self.links):
+            self.remove_link(name)
+        self.selector.close()
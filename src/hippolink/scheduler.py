@@ -0,0 +1,221 @@
+import collections
+import time
+
+
+class _TypeQueue(object):
+    __slots__ = ("msg_id", "priority", "min_interval", "replace_latest",
+                 "max_queue", "queue", "next_time", "queued", "sent",
+                 "replaced", "dropped")
+
+    def __init__(self, msg_id, priority=0, max_rate=None,
+                 replace_latest=False, max_queue=None):
+        self.msg_id = msg_id
+        self.queue = collections.deque()
+        # earliest time the next message of this type may be sent
+        self.next_time = 0.0
+        self.queued = 0
+        self.sent = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.configure(priority, max_rate, replace_latest, max_queue)
+
+    def configure(self, priority, max_rate, replace_latest, max_queue):
+        self.priority = priority
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.replace_latest = replace_latest
+        self.max_queue = max_queue
+
+    def to_dict(self):
+        return dict(priority=self.priority,
+                    queue_depth=len(self.queue),
+                    queued=self.queued,
+                    sent=self.sent,
+                    replaced=self.replaced,
+                    dropped=self.dropped)
+
+
+class SendScheduler(object):
+    '''Priority and rate aware sending for bandwidth-limited links.
+
+    Attach with HippoLink.set_send_scheduler. Afterwards send and
+    send_many of the link queue the messages here and poll() writes them
+    to the port, highest priority first and FIFO within the same priority.
+
+    byte_rate limits the encoded bytes written per second with a token
+    bucket holding up to burst bytes (default: one second worth of data,
+    at least one frame). A frame is written while the bucket is not
+    empty, its size is deducted afterwards. Per message type set_policy
+    configures the priority, a max_rate in messages per second,
+    replace_latest to keep only the newest queued message of that type
+    (e.g. stale POSE samples are dropped instead of delaying everything
+    else) and max_queue to drop the oldest queued message once the queue
+    is full.
+
+    Sending is strictly by priority: while the byte budget is used up no
+    lower priority message overtakes a queued higher priority one. Call
+    poll() periodically, next_send_time() tells when it is worth it.
+    '''
+    def __init__(self, byte_rate=None, burst=None, clock=time.monotonic):
+        self.link = None
+        self.byte_rate = byte_rate
+        self.burst = burst
+        self.clock = clock
+        self._queues = {}
+        self._default = dict(priority=0, max_rate=None, replace_latest=False,
+                             max_queue=None)
+        self._tokens = None
+        self._last_refill = None
+        self._seq = 0
+        self.stats = dict(messages_queued=0,
+                          messages_sent=0,
+                          bytes_sent=0,
+                          messages_replaced=0,
+                          messages_dropped=0)
+
+    def set_policy(self, msg_id, priority=0, max_rate=None,
+                   replace_latest=False, max_queue=None):
+        '''Configure the handling of one message type.
+
+        msg_id may also be a message class. Higher priorities are sent
+        first.
+        '''
+        msg_id = getattr(msg_id, "id", msg_id)
+        queue = self._queues.get(msg_id)
+        if queue is None:
+            self._queues[msg_id] = _TypeQueue(msg_id, priority, max_rate,
+                                              replace_latest, max_queue)
+        else:
+            queue.configure(priority, max_rate, replace_latest, max_queue)
+
+    def set_default_policy(self, priority=0, max_rate=None,
+                           replace_latest=False, max_queue=None):
+        '''Policy of message types without an explicit set_policy.'''
+        self._default = dict(priority=priority, max_rate=max_rate,
+                             replace_latest=replace_latest,
+                             max_queue=max_queue)
+
+    def set_byte_rate(self, byte_rate, burst=None):
+        self.byte_rate = byte_rate
+        self.burst = burst
+        self._tokens = None
+
+    @property
+    def queue_depth(self):
+        return sum(len(queue.queue) for queue in self._queues.values())
+
+    def type_stats(self, msg_id):
+        msg_id = getattr(msg_id, "id", msg_id)
+        queue = self._queues.get(msg_id)
+        return queue.to_dict() if queue is not None else None
+
+    def enqueue(self, msg):
+        '''Queue msg and send whatever the budget allows right away.'''
+        msg_id = msg.get_msg_id()
+        queue = self._queues.get(msg_id)
+        if queue is None:
+            queue = self._queues[msg_id] = _TypeQueue(msg_id,
+                                                      **self._default)
+        queue.queued += 1
+        self.stats["messages_queued"] += 1
+        if queue.replace_latest and queue.queue:
+            # keep the queue position of the replaced message
+            queue.queue[-1] = (queue.queue[-1][0], msg)
+            queue.replaced += 1
+            self.stats["messages_replaced"] += 1
+        else:
+            if queue.max_queue is not None and len(
+                    queue.queue) >= queue.max_queue:
+                queue.queue.popleft()
+                queue.dropped += 1
+                self.stats["messages_dropped"] += 1
+            queue.queue.append((self._seq, msg))
+            self._seq += 1
+        self.poll()
+
+    def _refill(self, now):
+        burst = self.burst
+        if burst is None:
+            burst = max(self.byte_rate, self.link.max_frame_len)
+        if self._tokens is None:
+            self._tokens = burst
+        else:
+            self._tokens = min(
+                burst, self._tokens + (now - self._last_refill) *
+                self.byte_rate)
+        self._last_refill = now
+
+    def _next_queue(self, now):
+        best = None
+        for queue in self._queues.values():
+            if not queue.queue or (now is not None
+                                   and queue.next_time > now):
+                continue
+            if (best is None or queue.priority > best.priority
+                    or (queue.priority == best.priority
+                        and queue.queue[0][0] < best.queue[0][0])):
+                best = queue
+        return best
+
+    def poll(self, now=None):
+        '''Send the queued messages the rate limits allow.
+
+        Returns the number of messages sent.
+        '''
+        return self._send(now, False)
+
+    def drain(self):
+        '''Send all queued messages by priority, ignoring the rate limits.'''
+        return self._send(None, True)
+
+    def _send(self, now, drain):
+        if self.link is None:
+            raise ValueError("Scheduler is not attached to a link.")
+        if now is None:
+            now = self.clock()
+        limited = self.byte_rate is not None and not drain
+        if limited:
+            self._refill(now)
+        link = self.link
+        n_sent = 0
+        while not limited or self._tokens > 0:
+            queue = self._next_queue(None if drain else now)
+            if queue is None:
+                break
+            _, msg = queue.queue.popleft()
+            if queue.min_interval:
+                queue.next_time = now + queue.min_interval
+            # frames are only encoded when they are written, the bucket may
+            # go negative by up to one frame and is paid back by waiting
+            encoded_msg = link._encode(msg)
+            link._write(msg, encoded_msg)
+            if limited:
+                self._tokens -= len(encoded_msg)
+            queue.sent += 1
+            self.stats["messages_sent"] += 1
+            self.stats["bytes_sent"] += len(encoded_msg)
+            n_sent += 1
+        return n_sent
+
+    def next_send_time(self):
+        '''Earliest time at which poll() can send something.
+
+        None if nothing is queued.
+        '''
+        next_time = None
+        for queue in self._queues.values():
+            if queue.queue and (next_time is None
+                                or queue.next_time < next_time):
+                next_time = queue.next_time
+        if (next_time is not None and self.byte_rate is not None
+                and self._tokens is not None and self._tokens <= 0):
+            next_time = max(
+                next_time,
+                self._last_refill - self._tokens / float(self.byte_rate))
+        return next_time
+
+    def clear(self):
+        '''Drop all queued messages, they are counted as dropped.'''
+        for queue in self._queues.values():
+            queue.dropped += len(queue.queue)
+            self.stats["messages_dropped"] += len(queue.queue)
+            queue.queue.clear()
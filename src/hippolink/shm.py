@@ -0,0 +1,246 @@
+# Shared memory ring buffer of raw frames for consumers in other processes.
+#
+# layout:
+#   header | slot 0 | slot 1 | ... | slot n_slots - 1
+# The header holds the sequence number of the last published frame. Frame
+# seq (counting from 1) goes into slot seq % n_slots. A slot is a slot
+# header followed by the COBS-decoded frame. There is a single writer and
+# any number of readers which never write to the buffer. The writer clears
+# the slot's seq before overwriting the slot and sets it afterwards, so a
+# reader that finds the expected seq before and after copying the frame
+# got a consistent copy (a seqlock per slot).
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from . import msgs
+from .logfile import RECEIVED
+
+MAGIC = b"HSHM"
+VERSION = 1
+DEFAULT_SLOTS = 4096
+
+# magic, version, slot size, number of slots, last published seq
+_header = struct.Struct("<4sB3xII8xQ")
+_HEADER_SIZE = 64
+_SEQ_OFFSET = 24
+# seq, timestamp, frame length, direction
+_slot_header = struct.Struct("<QdHB5x")
+_SLOT_SIZE = (_slot_header.size + msgs.MAX_FRAME_LEN + 7) // 8 * 8
+_seq = struct.Struct("<Q")
+
+
+class SharedMemoryError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+        self.message = msg
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    # keep the segment out of the resource tracker, which would unlink it
+    # when this process exits. It belongs to the publisher.
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedMemoryPublisher(object):
+    '''Publishes raw frames into a shared memory ring buffer.
+
+    Attach it to a link with HippoLink.set_log_writer to publish every
+    validated frame the link receives (and sends, if SENT is in
+    directions), or call write_frame/publish directly. The newest n_slots
+    frames are kept. name=None picks a random name, see self.name. The
+    segment is removed by unlink(), which readers still attached survive.
+    '''
+    def __init__(self, name=None, n_slots=DEFAULT_SLOTS,
+                 directions=(RECEIVED, )):
+        if n_slots < 1:
+            raise ValueError("n_slots has to be at least 1.")
+        self.n_slots = n_slots
+        self.directions = directions
+        self._shm = shared_memory.SharedMemory(
+            name, create=True, size=_HEADER_SIZE + n_slots * _SLOT_SIZE)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+        _header.pack_into(self._buf, 0, MAGIC, VERSION, _SLOT_SIZE, n_slots,
+                          0)
+        self._seq = 0
+        self._pack_buffer = bytearray(msgs.MAX_FRAME_LEN)
+
+    @property
+    def seq(self):
+        '''Sequence number of the last published frame.'''
+        return self._seq
+
+    def write_frame(self, frame, direction=RECEIVED, timestamp=None):
+        if direction not in self.directions:
+            return
+        frame_len = len(frame)
+        if frame_len > msgs.MAX_FRAME_LEN:
+            raise ValueError("Frame of {} bytes does not fit into a slot."
+                             .format(frame_len))
+        if timestamp is None:
+            timestamp = time.time()
+        seq = self._seq + 1
+        buf = self._buf
+        offset = _HEADER_SIZE + (seq % self.n_slots) * _SLOT_SIZE
+        _seq.pack_into(buf, offset, 0)
+        start = offset + _slot_header.size
+        buf[start:start + frame_len] = frame
+        _slot_header.pack_into(buf, offset, seq, timestamp, frame_len,
+                               direction)
+        _seq.pack_into(buf, _SEQ_OFFSET, seq)
+        self._seq = seq
+
+    def publish(self, msg, node_id, direction=RECEIVED, timestamp=None):
+        '''Pack msg as sent by node_id and publish the frame.'''
+        frame_len = msg.pack_into(self._pack_buffer, 0, node_id)
+        self.write_frame(
+            memoryview(self._pack_buffer)[:frame_len], direction, timestamp)
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self.close()
+        if self._shm is not None:
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+
+class SharedMemoryReader(object):
+    '''Reads the frames of a SharedMemoryPublisher without locking.
+
+    Readers never block the publisher. A reader that falls more than
+    n_slots frames behind has been overrun: the overwritten frames are
+    skipped and counted in stats["frames_lost"]. start="latest" only reads
+    frames published after attaching, start="oldest" also the ones still
+    in the buffer. Messages are decoded with link (a HippoLink, e.g. with
+    delta compression set), only the ones asked for.
+    '''
+    def __init__(self, name, start="latest", link=None):
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, version, slot_size, n_slots, seq = _header.unpack_from(
+            self._buf)
+        if magic != MAGIC or version != VERSION or slot_size != _SLOT_SIZE:
+            self.close()
+            raise SharedMemoryError(
+                "{} is no HippoLink ring buffer of version {}.".format(
+                    name, VERSION))
+        self.name = name
+        self.n_slots = n_slots
+        if start == "latest":
+            self._next = seq + 1
+        elif start == "oldest":
+            self._next = max(1, seq - n_slots + 1)
+        else:
+            raise ValueError("start has to be 'latest' or 'oldest'.")
+        if link is None:
+            from .hippolink import HippoLink
+            link = HippoLink(None, 0)
+        self.link = link
+        self.stats = dict(frames_read=0, frames_lost=0, overruns=0)
+
+    @property
+    def lag(self):
+        '''Number of published frames not read yet.'''
+        return _seq.unpack_from(self._buf, _SEQ_OFFSET)[0] - self._next + 1
+
+    def _lost(self, n):
+        self.stats["frames_lost"] += n
+        self.stats["overruns"] += 1
+
+    def read_frames(self, max_count=None, msg_id=None):
+        '''List of (seq, timestamp, direction, frame) published since the
+        last read, oldest first.
+
+        With msg_id (an ID, message class or a collection of IDs) given,
+        only those frames are copied out of the buffer.
+        '''
+        msg_id = getattr(msg_id, "id", msg_id)
+        if isinstance(msg_id, int):
+            msg_id = (msg_id, )
+        buf = self._buf
+        n_slots = self.n_slots
+        last = _seq.unpack_from(buf, _SEQ_OFFSET)[0]
+        if last - self._next >= n_slots:
+            # overwritten before we got here
+            self._lost(last - n_slots + 1 - self._next)
+            self._next = last - n_slots + 1
+        if max_count is not None:
+            last = min(last, self._next + max_count - 1)
+        frames = []
+        while self._next <= last:
+            seq = self._next
+            self._next += 1
+            offset = _HEADER_SIZE + (seq % n_slots) * _SLOT_SIZE
+            slot_seq, timestamp, frame_len, direction = \
+                _slot_header.unpack_from(buf, offset)
+            start = offset + _slot_header.size
+            if slot_seq == seq and (msg_id is None or frame_len < 3
+                                    or buf[start + 2] in msg_id):
+                frame = bytes(buf[start:start + frame_len])
+            else:
+                frame = None
+            if _seq.unpack_from(buf, offset)[0] != seq:
+                # the publisher lapped us while copying
+                self._lost(1)
+                continue
+            self.stats["frames_read"] += 1
+            if frame is not None:
+                frames.append((seq, timestamp, direction, frame))
+        return frames
+
+    def read(self, max_count=None, msg_id=None):
+        '''Decoded messages published since the last read, oldest first.
+
+        Frames that fail to decode are returned as HippoLink_bad_data.
+        '''
+        from .hippolink import HippoLink_bad_data, HippoLinkError
+        messages = []
+        for _, _, _, frame in self.read_frames(max_count, msg_id):
+            try:
+                messages.append(self.link.decode(frame))
+            except HippoLinkError as e:
+                messages.append(HippoLink_bad_data(frame, e.message))
+        return messages
+
+    def wait(self, timeout=None, interval=0.001):
+        '''Poll until there are unread frames, returns False on timeout.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.lag <= 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
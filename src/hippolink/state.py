@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class StateCache(object):
+    '''Latest received message per (node_id, msg_id).
+
+    Attach it with HippoLink.set_state_cache or call update(msg) yourself.
+    Every entry is a (msg, timestamp, count) tuple of the last message, its
+    receive time from clock (time.monotonic by default) and the number of
+    updates so far. Entries are replaced as a whole, so lookups need no
+    lock and are safe from any thread. msg_id may also be a message class,
+    node_id=None means the latest message of any node.
+
+    The cached messages are shared with everyone else who received them.
+    With a link using a pool.MessagePool, do not release messages that may
+    still be in the cache. With a lazy link, fields are unpacked on first
+    access.
+    '''
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        # (node_id, msg_id) and (None, msg_id) -> (msg, timestamp, count)
+        self._entries = {}
+        # number of updates per key, unlike the entries never cleared so
+        # wait cannot mistake a cleared and updated entry for an old one
+        self._versions = {}
+        self._updated = threading.Condition()
+
+    def update(self, msg, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+        node_id = msg.get_node_id()
+        msg_id = msg.get_msg_id()
+        entries = self._entries
+        versions = self._versions
+        with self._updated:
+            for key in ((node_id, msg_id), (None, msg_id)):
+                entry = entries.get(key)
+                entries[key] = (msg, timestamp,
+                                1 if entry is None else entry[2] + 1)
+                versions[key] = versions.get(key, 0) + 1
+            self._updated.notify_all()
+
+    def entry(self, msg_id, node_id=None):
+        '''(msg, timestamp, count) or None if nothing has been received.'''
+        return self._entries.get((node_id, getattr(msg_id, "id", msg_id)))
+
+    def get(self, msg_id, node_id=None):
+        '''The latest message or None.'''
+        entry = self._entries.get((node_id, getattr(msg_id, "id", msg_id)))
+        return None if entry is None else entry[0]
+
+    def age(self, msg_id, node_id=None):
+        '''Seconds since the latest message or None.'''
+        entry = self._entries.get((node_id, getattr(msg_id, "id", msg_id)))
+        return None if entry is None else self.clock() - entry[1]
+
+    def is_stale(self, msg_id, max_age, node_id=None):
+        '''True if there is no message younger than max_age seconds.'''
+        age = self.age(msg_id, node_id)
+        return age is None or age > max_age
+
+    def wait(self, msg_id, node_id=None, timeout=None):
+        '''Block until the next update of the entry and return its message.
+
+        Returns None if there was no update within timeout seconds.
+        '''
+        key = (node_id, getattr(msg_id, "id", msg_id))
+        versions = self._versions
+        with self._updated:
+            version = versions.get(key, 0)
+            if not self._updated.wait_for(
+                    lambda: versions.get(key, 0) != version
+                    and key in self._entries, timeout):
+                return None
+            return self._entries[key][0]
+
+    def keys(self):
+        '''(node_id, msg_id) of all cached entries.'''
+        return [key for key in list(self._entries) if key[0] is not None]
+
+    def __len__(self):
+        return len(self.keys())
+
+    def clear(self):
+        with self._updated:
+            self._entries.clear()
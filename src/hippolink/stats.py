@@ -0,0 +1,199 @@
+import bisect
+import collections
+import time
+
+# causes of receive errors as reported by HippoLinkError.cause and the
+# "error" events of LinkStats
+ERROR_SHORT = "short"
+ERROR_HEADER = "header"
+ERROR_LENGTH = "length"
+ERROR_UNKNOWN_ID = "unknown_id"
+ERROR_CRC = "crc"
+ERROR_PAYLOAD = "payload"
+ERROR_INSTANTIATE = "instantiate"
+ERROR_FRAMING = "framing"
+# decode_into was given an instance of another message type
+ERROR_TYPE = "type"
+# delta compressed frame whose reference sample is missing
+ERROR_DELTA = "delta"
+
+# upper bounds of the timing histogram bins in seconds, the last bin
+# collects everything above
+TIMING_BINS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3,
+               2e-3, 5e-3, 1e-2)
+
+
+class TimingHistogram(object):
+    def __init__(self, bins=TIMING_BINS):
+        self.bins = tuple(bins)
+        self.counts = [0] * (len(self.bins) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bins, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        if other.bins != self.bins:
+            raise ValueError("Histograms have different bins.")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        '''upper bound of the bin containing the p-th percentile'''
+        if not self.count:
+            return 0.0
+        threshold = p / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.bins, self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return self.max
+
+    def to_dict(self):
+        return dict(count=self.count,
+                    mean=self.mean(),
+                    max=self.max,
+                    p50=self.percentile(50),
+                    p99=self.percentile(99),
+                    bins=list(self.bins),
+                    counts=list(self.counts))
+
+
+class _Counters(object):
+    __slots__ = ("packets_sent", "bytes_sent", "packets_received",
+                 "bytes_received", "packets_filtered")
+
+    def __init__(self):
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_received = 0
+        self.bytes_received = 0
+        self.packets_filtered = 0
+
+    def merge(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self, elapsed):
+        d = dict((name, getattr(self, name)) for name in self.__slots__)
+        if elapsed > 0:
+            d["send_rate"] = self.packets_sent / elapsed
+            d["receive_rate"] = self.packets_received / elapsed
+            d["send_byte_rate"] = self.bytes_sent / elapsed
+            d["receive_byte_rate"] = self.bytes_received / elapsed
+        return d
+
+
+class LinkStats(object):
+    '''Per msg_id and node_id statistics of a HippoLink.
+
+    Attach with HippoLink.set_stats. While no LinkStats is attached the
+    link only pays for a single attribute check per frame. With
+    timing=True decode and encode durations are collected in histograms.
+    Sinks added with add_sink are called as sink(event, msg_id, node_id,
+    value) for the events "sent" and "received" (value: bytes),
+    "filtered" (value: bytes), "error" (value: cause, msg_id and node_id
+    may be None) and "decode_time"/"encode_time" (value: seconds).
+    '''
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.sinks = []
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.monotonic()
+        self.by_msg_id = collections.defaultdict(_Counters)
+        self.by_node_id = collections.defaultdict(_Counters)
+        self.errors = collections.Counter()
+        self.decode_times = TimingHistogram()
+        self.encode_times = TimingHistogram()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def _emit(self, event, msg_id, node_id, value):
+        for sink in self.sinks:
+            sink(event, msg_id, node_id, value)
+
+    def on_sent(self, msg_id, node_id, n_bytes):
+        counters = self.by_msg_id[msg_id]
+        counters.packets_sent += 1
+        counters.bytes_sent += n_bytes
+        counters = self.by_node_id[node_id]
+        counters.packets_sent += 1
+        counters.bytes_sent += n_bytes
+        if self.sinks:
+            self._emit("sent", msg_id, node_id, n_bytes)
+
+    def on_received(self, msg_id, node_id, n_bytes):
+        counters = self.by_msg_id[msg_id]
+        counters.packets_received += 1
+        counters.bytes_received += n_bytes
+        counters = self.by_node_id[node_id]
+        counters.packets_received += 1
+        counters.bytes_received += n_bytes
+        if self.sinks:
+            self._emit("received", msg_id, node_id, n_bytes)
+
+    def on_filtered(self, msg_id, node_id, n_bytes):
+        self.by_msg_id[msg_id].packets_filtered += 1
+        self.by_node_id[node_id].packets_filtered += 1
+        if self.sinks:
+            self._emit("filtered", msg_id, node_id, n_bytes)
+
+    def on_error(self, cause, msg_id=None, node_id=None):
+        self.errors[cause] += 1
+        if self.sinks:
+            self._emit("error", msg_id, node_id, cause)
+
+    def on_decode_time(self, msg_id, seconds):
+        self.decode_times.add(seconds)
+        if self.sinks:
+            self._emit("decode_time", msg_id, None, seconds)
+
+    def on_encode_time(self, msg_id, seconds):
+        self.encode_times.add(seconds)
+        if self.sinks:
+            self._emit("encode_time", msg_id, None, seconds)
+
+    def merge(self, other):
+        '''Add the counters and timings of another LinkStats.
+
+        Used to combine the statistics of several links or workers, sinks
+        are not called for the merged events.
+        '''
+        for key, counters in other.by_msg_id.items():
+            self.by_msg_id[key].merge(counters)
+        for key, counters in other.by_node_id.items():
+            self.by_node_id[key].merge(counters)
+        self.errors.update(other.errors)
+        self.decode_times.merge(other.decode_times)
+        self.encode_times.merge(other.encode_times)
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.start_time
+        d = dict(elapsed=elapsed,
+                 by_msg_id=dict((key, value.to_dict(elapsed))
+                                for key, value in self.by_msg_id.items()),
+                 by_node_id=dict((key, value.to_dict(elapsed))
+                                 for key, value in self.by_node_id.items()),
+                 errors=dict(self.errors))
+        if self.timing:
+            d["decode_times"] = self.decode_times.to_dict()
+            d["encode_times"] = self.encode_times.to_dict()
+        return d
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# run against the source tree, the generated messages (msgs.py and
+# dialects/) have to be built there, e.g. with setup.py build_py
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "src"))
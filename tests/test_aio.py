@@ -0,0 +1,103 @@
+import asyncio
+import os
+import pty
+import socket
+import tty
+
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.aio import AsyncHippoLink  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5.0))
+
+
+def test_socketpair_round_trip():
+    async def main():
+        a, b = socket.socketpair()
+        left = await AsyncHippoLink.open_connection(1, sock=a)
+        right = await AsyncHippoLink.open_connection(2, sock=b)
+        sent = [msgs.HippoLink_pose_2d_min_message(i, -i, 3)
+                for i in range(100)]
+        await left.send_many(sent[:50])
+        for msg in sent[50:]:
+            await left.send(msg)
+        received = [await right.recv() for _ in sent]
+        await left.close()
+        # end of stream once the other side is closed
+        assert await right.recv() is None
+        await right.close()
+        return received, left.link_stats, right.link_stats
+
+    received, sent_stats, received_stats = run(main())
+    assert [(msg.x, msg.y) for msg in received] == [(i, -i)
+                                                    for i in range(100)]
+    assert all(msg.get_node_id() == 1 for msg in received)
+    assert sent_stats["packets_sent"] == 100
+    assert received_stats["packets_received"] == 100
+    assert received_stats["receive_errors"] == 0
+
+
+def test_async_iteration_stops_at_end_of_stream():
+    async def main():
+        a, b = socket.socketpair()
+        left = await AsyncHippoLink.open_connection(1, sock=a)
+        right = await AsyncHippoLink.open_connection(2, sock=b)
+        for i in range(3):
+            await left.send(msgs.HippoLink_radio_rssi_report_message(i, 1, 2))
+        await left.close()
+        received = [msg.remote_id async for msg in right]
+        await right.close()
+        return received
+
+    assert run(main()) == [0, 1, 2]
+
+
+def test_open_connection_link_kwargs():
+    async def main():
+        a, b = socket.socketpair()
+        left = await AsyncHippoLink.open_connection(1, sock=a)
+        right = await AsyncHippoLink.open_connection(
+            2, sock=b, read_size=16, link_kwargs=dict(lazy=True))
+        await left.send(msgs.HippoLink_pose_2d_min_message(3, 4, 5))
+        msg = await right.recv()
+        # not unpacked before the first field access
+        lazy = msg._lazy_payload is not None
+        await left.close()
+        await right.close()
+        return right, msg, lazy
+
+    right, msg, lazy = run(main())
+    assert right.read_size == 16
+    assert right.link.lazy
+    assert lazy
+    assert (msg.x, msg.y, msg.yaw) == (3, 4, 5)
+
+
+def test_pty_round_trip():
+    async def main():
+        master, slave = pty.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        try:
+            left = await AsyncHippoLink.open_fd(master, 1)
+            right = await AsyncHippoLink.open_fd(slave, 2)
+            await left.send(msgs.HippoLink_path_target_message(1.5, 2.5, 0,
+                                                               42))
+            to_right = await right.recv()
+            await right.send(msgs.HippoLink_pose_2d_min_message(7, 8, 9))
+            to_left = await left.recv()
+            await left.close()
+            await right.close()
+        finally:
+            os.close(master)
+            os.close(slave)
+        return to_right, to_left
+
+    to_right, to_left = run(main())
+    assert (to_right.x, to_right.y, to_right.index) == (1.5, 2.5, 42)
+    assert to_right.get_node_id() == 1
+    assert (to_left.x, to_left.y, to_left.yaw) == (7, 8, 9)
+    assert to_left.get_node_id() == 2
@@ -0,0 +1,48 @@
+import pytest
+
+from hippolink import cobs
+
+SAMPLES = [
+    b"",
+    b"\x00",
+    b"\x00" * 10,
+    b"\x11\x22\x00\x33",
+    b"\x11\x00",
+    bytes(range(1, 255)),
+    bytes(range(1, 255)) + b"\x07",
+    b"\x01" * 253,
+    b"\x01" * 508 + b"\x00" + b"\x02" * 300,
+    bytes(range(256)) * 3,
+]
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_round_trip(data):
+    encoded = cobs.encode(data)
+    # exactly one zero, the delimiter
+    assert encoded.index(0) == len(encoded) - 1
+    assert len(encoded) <= cobs.max_encoded_len(len(data))
+    assert cobs.decode(encoded) == data
+    assert cobs.decode(encoded[:-1]) == data
+    assert cobs.decode(memoryview(bytes(encoded))) == data
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_round_trip_into(data):
+    offset = 3
+    out = bytearray(b"\xee" * (offset + cobs.max_encoded_len(len(data))))
+    n = cobs.encode_into(memoryview(data), out, offset)
+    assert out[:offset] == b"\xee" * offset
+    assert out[offset:offset + n] == cobs.encode(data)
+    decoded = bytearray(offset + n)
+    m = cobs.decode_into(out[offset:offset + n], decoded, offset)
+    assert decoded[offset:offset + m] == data
+
+
+def test_full_blocks():
+    block = bytes(range(1, 255))
+    assert cobs.encode(b"") == b"\x01\x00"
+    assert cobs.encode(block) == b"\xff" + block + b"\x01\x00"
+    # a 0xFF block does not imply a zero after it
+    assert cobs.encode(block + b"\x00") == b"\xff" + block + b"\x01\x01\x00"
+    assert cobs.decode(b"\xff" + block + b"\x02\x05\x00") == block + b"\x05"
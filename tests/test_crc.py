@@ -0,0 +1,49 @@
+import array
+import struct
+
+from hippolink.crc import crc16, crc16_many, check_many, x25crc
+
+
+def bitwise_crc16(data):
+    # CRC-16/MCRF4XX: reflected polynomial 0x1021, init 0xffff, no xorout
+    crc = 0xffff
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc
+
+
+def test_known_vectors():
+    # check value of the CRC catalogue entry
+    assert crc16(b"123456789") == 0x6f91
+    assert crc16(b"") == 0xffff
+    assert x25crc(b"123456789").crc == 0x6f91
+    assert x25crc("123456789").crc == 0x6f91
+    for data in (b"\x00", b"\xff" * 7, bytes(range(256))):
+        assert crc16(data) == bitwise_crc16(data)
+
+
+def test_crc_extra_and_buffer_types():
+    data = bytes(range(40))
+    crc = crc16(data + b"\x2a")
+    assert crc16(data, 0x2a) == crc
+    assert crc16(bytearray(data), 0x2a) == crc
+    assert crc16(memoryview(data), 0x2a) == crc
+    # non-byte formats are read as their raw bytes
+    assert crc16(memoryview(array.array("H", [1, 2, 3]))) == crc16(
+        struct.pack("=HHH", 1, 2, 3))
+    # accumulating in pieces
+    assert crc16(data[20:], 0x2a, crc=crc16(data[:20])) == crc
+
+
+def test_many_and_check_many():
+    bufs = [b"", b"123456789", bytes(range(100))]
+    extras = [None, 7, 250]
+    assert crc16_many(bufs) == [crc16(buf) for buf in bufs]
+    crcs = crc16_many(bufs, extras)
+    assert crcs == [crc16(buf, extra) for buf, extra in zip(bufs, extras)]
+    frames = [buf + struct.pack("<H", crc) for buf, crc in zip(bufs, crcs)]
+    assert check_many(frames, extras) == [True, True, True]
+    broken = [frames[0], frames[1][:-1] + b"\x00", b"\x01"]
+    assert check_many(broken, extras) == [True, False, False]
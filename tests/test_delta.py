@@ -0,0 +1,91 @@
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.delta import DeltaCompression, DELTA_MSG_ID  # noqa: E402
+from hippolink.hippolink import HippoLink  # noqa: E402
+
+
+class Port(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+def compressing_link(node_id=7, **kwargs):
+    link = HippoLink(Port(), node_id)
+    link.set_delta_compression(
+        DeltaCompression([msgs.HippoLink_pose_2d_min_message], **kwargs))
+    return link
+
+
+def test_sent_message_keeps_its_header():
+    link = compressing_link()
+    sent = []
+    link.set_send_callback(sent.append)
+    plain = msgs.HippoLink_pose_2d_min_message(1000, 2000, 3)
+    expected = bytes(plain.pack(HippoLink(None, 7)))
+    for i in range(3):
+        msg = msgs.HippoLink_pose_2d_min_message(1000 + i, 2000, 3)
+        link.send(msg)
+        assert msg.get_msg_id() == msgs.HippoLink_pose_2d_min_message.id
+        assert msg.get_node_id() == 7
+        assert msg.get_header().msg_len == len(msg.get_payload())
+        assert msg.get_msg_buffer()[2] != DELTA_MSG_ID
+    assert bytes(sent[0].get_msg_buffer()) == expected
+    assert link.delta_compression.stats["deltas_sent"] == 2
+
+
+def test_compression_leaves_message_untouched():
+    link = compressing_link()
+    link.send(msgs.HippoLink_pose_2d_min_message(1000, 2000, 3))
+    msg = msgs.HippoLink_pose_2d_min_message(1001, 2000, 3)
+    link.send(msg)
+    assert link.delta_compression.stats["deltas_sent"] == 1
+    # no header of the compressed frame stored in msg
+    header = msg.get_header()
+    assert (header.msg_id, header.msg_len, header.node_id) == (
+        msgs.HippoLink_pose_2d_min_message.id, 0, 0)
+    assert msg.get_crc() is None
+
+
+def lossy_round_trip(reference, lost):
+    sender = HippoLink(Port(), 7)
+    sender.set_delta_compression(DeltaCompression(
+        [msgs.HippoLink_pose_message], keyframe_interval=5,
+        reference=reference))
+    sent = [msgs.HippoLink_pose_message(0.25 * i, 1.0, -2.0, 0.0, 0.0,
+                                        0.0, 1.0) for i in range(12)]
+    sender.send_many(sent)
+    stats = sender.delta_compression.stats
+    assert (stats["keyframes_sent"], stats["deltas_sent"]) == (3, 9)
+    receiver = HippoLink(None, 0)
+    receiver.set_delta_compression(DeltaCompression())
+    frames = receiver.split_frames(sender.port.data)
+    assert len(frames) == len(sent)
+    received = []
+    for i, frame in enumerate(frames):
+        if i != lost:
+            received.append(receiver.feed(frame)[0])
+    return sent, received, receiver
+
+
+def test_previous_reference_resyncs_at_keyframe():
+    sent, received, receiver = lossy_round_trip("previous", lost=2)
+    # the deltas after the lost one fail until the keyframe of sample 5
+    assert [msg.get_type() for msg in received[2:4]] == ["BAD_DATA"] * 2
+    decoded = received[:2] + received[4:]
+    assert [msg.x for msg in decoded] == [msg.x for msg in sent[:2] +
+                                          sent[5:]]
+    assert all(msg.get_node_id() == 7 for msg in decoded)
+    assert receiver.delta_compression.stats["deltas_dropped"] == 2
+    assert receiver.link_stats["receive_errors"] == 2
+
+
+def test_keyframe_reference_only_loses_the_lost_frame():
+    sent, received, receiver = lossy_round_trip("keyframe", lost=2)
+    assert [msg.x for msg in received] == [
+        msg.x for i, msg in enumerate(sent) if i != 2]
+    assert receiver.delta_compression.stats["deltas_dropped"] == 0
+    assert receiver.link_stats["receive_errors"] == 0
@@ -0,0 +1,81 @@
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.hippolink import HippoLink  # noqa: E402
+
+
+class Port(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+def stream():
+    data = bytearray()
+    for node_id in (1, 2, 3):
+        link = HippoLink(Port(), node_id)
+        link.send(msgs.HippoLink_pose_2d_min_message(node_id, 0, 0))
+        link.send(msgs.HippoLink_radio_rssi_report_message(node_id, 1, 2))
+        data += link.port.data
+    return bytes(data)
+
+
+def received(messages):
+    return [(msg.get_msg_id(), msg.get_node_id()) for msg in messages]
+
+
+def test_split_frames_keeps_partial_frames():
+    data = stream()
+    frames = HippoLink(None, 0).split_frames(data)
+    assert len(frames) == 6
+    for cut in range(len(data) + 1):
+        link = HippoLink(None, 0)
+        assert link.split_frames(data[:cut]) + link.split_frames(
+            data[cut:]) == frames
+        assert link.buffer == b""
+    link = HippoLink(None, 0)
+    assert len(link.split_frames(data[:-1])) == 5
+    assert bytes(link.buffer) == frames[-1][:-1]
+
+
+def test_feed_byte_by_byte():
+    data = stream()
+    expected = received(HippoLink(None, 0).feed(data))
+    assert len(expected) == 6
+    link = HippoLink(None, 0)
+    messages = []
+    for i in range(len(data)):
+        messages += link.feed(data[i:i + 1])
+    assert received(messages) == expected
+    assert link.link_stats["packets_received"] == 6
+    assert link.link_stats["receive_errors"] == 0
+
+
+def test_feed_resyncs_after_oversized_frame():
+    link = HippoLink(None, 0)
+    garbage = b"\x01" * (link.max_frame_len + 1)
+    # the delimiter ending the garbage arrives with the next frames
+    assert link.feed(garbage[:100]) == []
+    assert link.feed(garbage[100:]) == []
+    messages = link.feed(b"\x00" + stream())
+    assert len(messages) == 6
+    assert link.link_stats["receive_errors"] == 1
+
+
+def test_subscription_filters_by_node():
+    data = stream()
+    link = HippoLink(None, 0)
+    poses, node_2 = [], []
+    link.subscribe(msgs.HippoLink_pose_2d_min_message, poses.append)
+    link.subscribe(msgs.HippoLink_radio_rssi_report_message.id,
+                   node_2.append, node_id=2)
+    messages = []
+    for i in range(0, len(data), 5):
+        messages += link.feed(data[i:i + 5])
+    assert [msg.get_node_id() for msg in poses] == [1, 2, 3]
+    assert received(node_2) == [
+        (msgs.HippoLink_radio_rssi_report_message.id, 2)]
+    assert received(messages) == received(poses[:2] + node_2 + poses[2:])
+    assert link.link_stats["packets_filtered"] == 2
@@ -0,0 +1,109 @@
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from hippolink.generation import hippoparse
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src", "hippolink")
+
+ARRAY_DIALECT = '''<?xml version="1.0" encoding="UTF-8"?>
+<hippolink>
+  <messages>
+    <message id="40" name="POSE_COV">
+      <field type="uint64_t" name="stamp">Time stamp</field>
+      <field type="float[3]" name="position">Position</field>
+      <field type="float[36]" name="covariance">Covariance</field>
+      <field type="uint8_t" name="frame">Frame</field>
+      <field type="char[8]" name="label">Label</field>
+      <field type="int16_t[4]" name="raw">Raw values</field>
+    </message>
+  </messages>
+</hippolink>
+'''
+
+ROUND_TRIP = '''
+import array
+from hippolink import msgs
+from hippolink.hippolink import HippoLink
+
+
+class Port(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+covariance = array.array("f", [0.5 * i for i in range(36)])
+sent = [
+    msgs.HippoLink_pose_cov_message(
+        2 ** 40, [1.0, -2.0, 3.5], covariance, 3, b"cov", [1, -2, 3, 0]),
+    # trailing zeros of the last array are truncated on the wire
+    msgs.HippoLink_pose_cov_message(
+        1, [0.0, 0.0, 1.0], [0.0] * 36, 0, b"", array.array("h", [5] * 4)),
+]
+link = HippoLink(Port(), 4)
+for msg in sent:
+    link.send(msg)
+received = HippoLink(None, 0).feed(link.port.data)
+assert [msg.to_dict() for msg in received] == [
+    msg.to_dict() for msg in sent], received
+assert isinstance(received[0].covariance, array.array)
+assert list(received[0].raw) == [1, -2, 3, 0]
+print("round trip ok")
+'''
+
+
+def test_parse_array_types(tmp_path):
+    path = tmp_path / "arrays.xml"
+    path.write_text(ARRAY_DIALECT)
+    msg, = hippoparse.HippoXml(str(path)).message
+    fields = dict((field.name, field) for field in msg.fields)
+    assert [(fields[name].type, fields[name].array_length,
+             fields[name].wire_length)
+            for name in ("stamp", "position", "covariance", "label",
+                         "raw")] == [
+        ("uint64_t", 0, 8), ("float", 3, 12), ("float", 36, 144),
+        ("char", 8, 8), ("int16_t", 4, 8)]
+
+
+@pytest.mark.parametrize("type", ["float[]", "float[0]", "float[x]",
+                                  "vector[3]"])
+def test_parse_invalid_array_types(tmp_path, type):
+    path = tmp_path / "invalid.xml"
+    path.write_text(ARRAY_DIALECT.replace("float[3]", type))
+    with pytest.raises(Exception):
+        hippoparse.HippoXml(str(path))
+
+
+def test_array_fields_round_trip(tmp_path):
+    pytest.importorskip("yapf")
+    package = tmp_path / "hippolink"
+    shutil.copytree(PACKAGE_DIR, str(package),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    (tmp_path / "arrays.xml").write_text(ARRAY_DIALECT)
+    # the generated modules import hippolink, so they are exercised in a
+    # separate interpreter
+    generate = textwrap.dedent('''
+        import sys
+        sys.path.insert(0, {root!r})
+        from hippolink.generation import hippogen_python, hippoparse
+        xmls = [hippoparse.HippoXml(path) for path in {xmls!r}]
+        hippogen_python.generate(xmls, {out!r})
+        ''').format(
+            root=str(tmp_path),
+            xmls=[os.path.join(PACKAGE_DIR, "definitions", "hippolink.xml"),
+                  str(tmp_path / "arrays.xml")],
+            out=str(package / "msgs.py"))
+    subprocess.check_call([sys.executable, "-c", generate])
+    output = subprocess.check_output(
+        [sys.executable, "-c",
+         "import sys\nsys.path.insert(0, {!r})\n".format(str(tmp_path)) +
+         ROUND_TRIP])
+    assert b"round trip ok" in output
@@ -0,0 +1,74 @@
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink import cobs  # noqa: E402
+from hippolink.delta import DeltaCompression  # noqa: E402
+from hippolink.hippolink import HippoLink  # noqa: E402
+from hippolink.logfile import (  # noqa: E402
+    LogReader, LogWriter, RECEIVED, SENT)
+
+
+class Port(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+def write_log(path, messages, compressed=()):
+    link = HippoLink(Port(), 7)
+    link.set_delta_compression(
+        DeltaCompression(compressed, keyframe_interval=10))
+    link.send_many(messages)
+    frames = [cobs.decode(frame)
+              for frame in HippoLink(None, 0).split_frames(link.port.data)]
+    with LogWriter(path) as writer:
+        for i, frame in enumerate(frames):
+            writer.write_frame(frame, SENT, timestamp=float(i))
+    return frames
+
+
+def samples(n):
+    messages = []
+    for i in range(n):
+        messages.append(msgs.HippoLink_pose_message(
+            0.5 * i, 1.0, -2.0, 0.0, 0.0, 0.0, 1.0))
+        messages.append(msgs.HippoLink_radio_rssi_report_message(i % 7, 1, 2))
+    return messages
+
+
+def fields(messages):
+    return [msg.to_dict() for msg in messages]
+
+
+def test_messages_round_trip(tmp_path):
+    path = str(tmp_path / "plain.hlog")
+    messages = samples(20)
+    write_log(path, messages)
+    with LogReader(path) as reader:
+        assert len(reader) == len(messages)
+        logged = [msg for _, msg in reader.messages()]
+        assert fields(logged) == fields(messages)
+        assert all(msg.get_node_id() == 7 for msg in logged)
+        rssi = [msg for _, msg in reader.messages(
+            msgs.HippoLink_radio_rssi_report_message, start=10.0)]
+        assert fields(rssi) == fields(messages[11::2])
+        assert list(reader.messages(direction=RECEIVED)) == []
+
+
+def test_messages_of_delta_compressed_log(tmp_path):
+    path = str(tmp_path / "delta.hlog")
+    messages = samples(50)
+    write_log(path, messages, [msgs.HippoLink_pose_message])
+    with LogReader(path) as reader:
+        logged = [msg for _, msg in reader.messages()]
+        assert fields(logged) == fields(messages)
+        assert all(msg.get_node_id() == 7 for msg in logged)
+        # selected by the msg_id of the compressed messages, starting
+        # between two keyframes
+        poses = [(timestamp, msg) for timestamp, msg in reader.messages(
+            msgs.HippoLink_pose_message, start=35.0)]
+        assert [timestamp for timestamp, _ in poses] == [
+            float(i) for i in range(36, 100, 2)]
+        assert fields([msg for _, msg in poses]) == fields(messages[36::2])
@@ -0,0 +1,139 @@
+import socket
+import time
+
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink import cobs  # noqa: E402
+from hippolink.hippolink import HippoLink  # noqa: E402
+from hippolink.net import UdpPort, TcpPort, split_datagrams  # noqa: E402
+
+LOCALHOST = ("127.0.0.1", 0)
+
+
+def test_split_datagrams_on_frame_boundaries():
+    data = b"".join(cobs.encode(bytes([i]) * 50) for i in range(1, 40))
+    chunks = split_datagrams(data, 200)
+    assert b"".join(chunks) == data
+    assert all(len(chunk) <= 200 and chunk.endswith(b"\x00")
+               for chunk in chunks)
+    # a frame larger than max_size gets a chunk of its own
+    large = cobs.encode(bytes(range(1, 250)))
+    assert split_datagrams(large + large, 100) == [large, large]
+
+
+def test_udp_loopback():
+    with UdpPort(LOCALHOST, timeout=1.0) as a, \
+            UdpPort(LOCALHOST, peers=[a.local_addr], timeout=1.0,
+                    max_datagram=200) as b:
+        link_a, link_b = HippoLink(a, 1), HippoLink(b, 2)
+        link_b.set_send_buffering(b.max_datagram)
+        for i in range(100):
+            link_b.send(msgs.HippoLink_pose_2d_min_message(i, -i, 0))
+        link_b.flush()
+        received = [link_a.recv_msg() for _ in range(100)]
+        assert [(msg.x, msg.y) for msg in received] == [
+            (i, -i) for i in range(100)]
+        # batched into full datagrams
+        assert a.stats["datagrams_received"] == b.stats["datagrams_sent"]
+        assert b.stats["datagrams_sent"] < 20
+        assert a.stats["bytes_discarded"] == 0
+        assert a.peers == {2: b.local_addr}
+
+        # answers go to the learned peer
+        link_a.send(msgs.HippoLink_pose_2d_min_message(7, 0, 0))
+        assert link_b.recv_msg().x == 7
+        assert b.peers == {1: a.local_addr}
+
+        a.timeout = 0
+        start = time.monotonic()
+        assert link_a.recv_msg() is None
+        assert time.monotonic() - start < 0.5
+
+
+def test_tcp_loopback():
+    with TcpPort(timeout=1.0) as server, TcpPort(timeout=1.0) as client_1, \
+            TcpPort(timeout=1.0) as client_2:
+        addr = server.listen(LOCALHOST)
+        client_1.connect(addr)
+        client_2.connect(addr)
+        assert client_1.connect(addr) is client_1.connections[0]
+        link_1 = HippoLink(client_1, 10)
+        link_2 = HippoLink(client_2, 20)
+        link_server = HippoLink(server, 1)
+
+        # more than the socket buffers take at once
+        count = 20000
+        link_1.send_many([msgs.HippoLink_pose_message(i, 1, 2, 3, 4, 5, 6)
+                          for i in range(count)])
+        link_2.send(msgs.HippoLink_pose_2d_min_message(5, 0, 0))
+        received = []
+        while len(received) < count + 1:
+            # keep flushing the buffered rest of the client
+            client_1.poll(0)
+            msg = link_server.recv_msg()
+            assert msg is not None
+            received.append(msg)
+        assert not client_1.connections[0].out_buffer
+        assert [msg.x for msg in received
+                if msg.get_node_id() == 10] == list(range(count))
+        assert link_server.link_stats["receive_errors"] == 0
+        assert sorted(server.peers) == [10, 20]
+        assert server.stats["connections_opened"] == 2
+
+        # write to a single node
+        link_server.port.write(
+            cobs.encode(bytes(
+                msgs.HippoLink_pose_2d_min_message(9, 0, 0).pack(
+                    link_server))),
+            node_id=20)
+        assert link_2.recv_msg().x == 9
+        client_1.timeout = 0
+        assert link_1.recv_msg() is None
+
+        # closed connections are dropped together with their peers
+        client_2.close()
+        deadline = time.monotonic() + 1.0
+        while 20 in server.peers and time.monotonic() < deadline:
+            server.poll(0.1)
+        assert sorted(server.peers) == [10]
+        assert server.stats["connections_closed"] == 1
+
+
+def test_udp_send_errors_drop_datagrams():
+    with UdpPort(LOCALHOST) as a, \
+            UdpPort(LOCALHOST, peers=[a.local_addr],
+                    max_datagram=200000) as b:
+        link = HippoLink(b, 2)
+        count = 3000
+        # a single datagram larger than UDP allows
+        link.send_many([msgs.HippoLink_pose_message(i, 1, 2, 3, 4, 5, 6)
+                        for i in range(count)])
+        assert b.stats["datagrams_dropped"] == 1
+        assert b.stats["datagrams_sent"] == 0
+        assert link.link_stats["packets_dropped"] == count
+        assert link.link_stats["packets_sent"] == 0
+
+
+def test_tcp_buffer_of_stalled_peer_is_capped():
+    with TcpPort(timeout=1.0) as server, \
+            TcpPort(timeout=1.0, max_buffer=10000) as client:
+        client.connect(server.listen(LOCALHOST))
+        server.poll(1.0)
+        assert len(server.connections) == 1
+        server.connections[0].sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        client.connections[0].sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        link = HippoLink(client, 10)
+        count = 20000
+        # the server never reads
+        for i in range(count):
+            link.send(msgs.HippoLink_pose_message(i, 1, 2, 3, 4, 5, 6))
+        connection = client.connections[0]
+        assert len(connection.out_buffer) <= client.max_buffer
+        assert client.stats["frames_dropped"] > 0
+        assert (link.link_stats["packets_dropped"] ==
+                client.stats["frames_dropped"])
+        assert (link.link_stats["packets_sent"] +
+                link.link_stats["packets_dropped"] == count)
@@ -0,0 +1,90 @@
+import socket
+
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.hippolink import HippoLink  # noqa: E402
+from hippolink.router import HippoLinkRouter  # noqa: E402
+
+
+class SocketPort(object):
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+
+@pytest.fixture
+def router():
+    router = HippoLinkRouter()
+    yield router
+    router.close()
+
+
+def receive_all(sock):
+    sock.setblocking(False)
+    data = bytearray()
+    while True:
+        try:
+            chunk = sock.recv(65536)
+        except BlockingIOError:
+            return bytes(data)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+
+
+def test_forwarding_between_links(router):
+    a, a_peer = socket.socketpair()
+    b, b_peer = socket.socketpair()
+    router.add_link("a", a, 0, deliver=False)
+    router.add_link("b", b, 0, deliver=False)
+    router.add_route("a", "b", node_ids=[5])
+    for node_id in (5, 6):
+        HippoLink(SocketPort(a_peer), node_id).send(
+            msgs.HippoLink_pose_2d_min_message(node_id, 0, 0))
+    router.poll(1.0)
+    received = HippoLink(None, 0).feed(receive_all(b_peer))
+    assert [msg.get_node_id() for msg in received] == [5]
+    assert router.link_stats("a")["frames_forwarded_in"] == 1
+    assert router.link_stats("b")["frames_forwarded_out"] == 1
+
+
+def test_full_buffer_drops_frames(router):
+    sock, peer = socket.socketpair()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    router.add_link("a", sock, 0, max_buffer=1000)
+    count = 5000
+    for i in range(count):
+        router.send("a", msgs.HippoLink_pose_2d_min_message(i, 0, 0))
+    stats = router.link_stats("a")
+    assert stats["frames_overflowed"] > 0
+    assert stats["packets_dropped"] == stats["frames_overflowed"]
+    assert stats["packets_sent"] + stats["packets_dropped"] == count
+    assert len(router.links["a"].out_buffer) <= 1000
+    peer.close()
+
+
+def test_failed_write_removes_link(router):
+    a, a_peer = socket.socketpair()
+    b, b_peer = socket.socketpair()
+    c, c_peer = socket.socketpair()
+    router.add_link("a", a, 0, deliver=False)
+    router.add_link("b", b, 0, deliver=False)
+    router.add_link("c", c, 0, deliver=False)
+    router.add_route("a", "b")
+    router.add_route("a", "c")
+    # b still looks open for reading, only writing to it fails
+    b_peer.shutdown(socket.SHUT_RD)
+    HippoLink(SocketPort(a_peer), 5).send(
+        msgs.HippoLink_pose_2d_min_message(1, 0, 0))
+    router.poll(1.0)
+    # writing to b failed, the other links keep working
+    assert sorted(router.links) == ["a", "c"]
+    assert b.fileno() == -1
+    received = HippoLink(None, 0).feed(receive_all(c_peer))
+    assert [msg.x for msg in received] == [1]
+    router.send("c", msgs.HippoLink_pose_2d_min_message(2, 0, 0))
+    assert [msg.x for msg in HippoLink(None, 0).feed(
+        receive_all(c_peer))] == [2]
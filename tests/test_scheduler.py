@@ -0,0 +1,65 @@
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.hippolink import HippoLink  # noqa: E402
+from hippolink.scheduler import SendScheduler  # noqa: E402
+
+
+class Port(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_link(byte_rate, burst=None):
+    clock = Clock()
+    scheduler = SendScheduler(byte_rate, burst, clock=clock)
+    link = HippoLink(Port(), 1)
+    link.set_send_scheduler(scheduler)
+    return link, scheduler, clock
+
+
+def frame_len(msg):
+    return len(HippoLink(None, 1)._encode(msg))
+
+
+def test_empty_bucket_stops_sending():
+    msg = msgs.HippoLink_pose_2d_min_message(1, 2, 3)
+    size = frame_len(msg)
+    # the bucket holds exactly one frame
+    link, scheduler, clock = make_link(byte_rate=size, burst=size)
+    link.send(msg)
+    link.send(msgs.HippoLink_pose_2d_min_message(4, 5, 6))
+    assert len(link.port.writes) == 1
+    assert scheduler.queue_depth == 1
+    assert scheduler.next_send_time() == clock.now
+    clock.now = 0.5
+    assert scheduler.poll() == 1
+    assert len(link.port.writes) == 2
+    # the second frame overdrew the bucket by half a frame
+    assert scheduler.next_send_time() is None
+    link.send(msg)
+    assert scheduler.poll() == 0
+    assert scheduler.next_send_time() == pytest.approx(1.0)
+
+
+def test_priority_order_and_drain():
+    link, scheduler, clock = make_link(byte_rate=1, burst=1)
+    scheduler.set_policy(msgs.HippoLink_pose_2d_min_message, priority=1)
+    # the first message uses up the bucket, the rest is queued
+    link.send(msgs.HippoLink_path_target_2d_min_message(0, 0, 0))
+    link.send(msgs.HippoLink_path_target_2d_min_message(1, 0, 0))
+    link.send(msgs.HippoLink_pose_2d_min_message(2, 0, 0))
+    assert scheduler.drain() == 2
+    received = HippoLink(None, 0).feed(b"".join(link.port.writes))
+    assert [msg.x for msg in received] == [0, 2, 1]
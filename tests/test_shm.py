@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.shm import (  # noqa: E402
+    SharedMemoryPublisher, SharedMemoryReader)
+
+TIMEOUT = 10.0
+
+
+def segment_name():
+    return "hippolink_test_{}_{}".format(os.getpid(), os.urandom(4).hex())
+
+
+def writer(name, n_slots, count, created, attached, published, done):
+    with SharedMemoryPublisher(name, n_slots=n_slots) as publisher:
+        created.set()
+        attached.wait(TIMEOUT)
+        for i in range(count):
+            publisher.publish(
+                msgs.HippoLink_pose_2d_min_message(i, -i, 0), 1)
+        published.set()
+        # the reader has to attach before the segment is unlinked
+        done.wait(TIMEOUT)
+
+
+def reader(name, count, created, attached, published, done, wait_published,
+           results):
+    created.wait(TIMEOUT)
+    with SharedMemoryReader(name, start="oldest") as shm_reader:
+        attached.set()
+        if wait_published:
+            published.wait(TIMEOUT)
+        lag = shm_reader.lag
+        received = []
+        while len(received) < count and shm_reader.wait(TIMEOUT):
+            received.extend((msg.x, msg.y, msg.get_node_id())
+                            for msg in shm_reader.read())
+            if wait_published:
+                break
+        results.put((lag, received, shm_reader.stats))
+    done.set()
+
+
+def run_processes(n_slots, count, wait_published):
+    ctx = multiprocessing.get_context()
+    name = segment_name()
+    created, attached, published, done = [ctx.Event() for _ in range(4)]
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=writer,
+                    args=(name, n_slots, count, created, attached,
+                          published, done)),
+        ctx.Process(target=reader,
+                    args=(name, count, created, attached, published, done,
+                          wait_published, results))]
+    for process in processes:
+        process.start()
+    try:
+        result = results.get(timeout=TIMEOUT)
+    finally:
+        for process in processes:
+            process.join(TIMEOUT)
+    assert [process.exitcode for process in processes] == [0, 0]
+    return result
+
+
+def test_frames_arrive_in_order_across_processes():
+    count = 2000
+    _, received, stats = run_processes(4096, count, False)
+    assert received == [(i, -i, 1) for i in range(count)]
+    assert stats == dict(frames_read=count, frames_lost=0, overruns=0)
+
+
+def test_overrun_reader_skips_overwritten_frames_across_processes():
+    n_slots = 16
+    count = 100
+    lag, received, stats = run_processes(n_slots, count, True)
+    assert lag == count
+    # only the newest n_slots frames are left in the ring
+    assert received == [(i, -i, 1) for i in range(count - n_slots, count)]
+    assert stats == dict(frames_read=n_slots, frames_lost=count - n_slots,
+                         overruns=1)
+
+
+def test_lag_and_msg_id_filter():
+    with SharedMemoryPublisher(segment_name(), n_slots=8) as publisher:
+        with SharedMemoryReader(publisher.name) as shm_reader:
+            assert shm_reader.lag == 0
+            for i in range(6):
+                if i % 2:
+                    msg = msgs.HippoLink_pose_2d_min_message(i, 0, 0)
+                else:
+                    msg = msgs.HippoLink_path_target_2d_min_message(i, 0, 0)
+                publisher.publish(msg, 3)
+            assert shm_reader.lag == 6
+            received = shm_reader.read(
+                msg_id=msgs.HippoLink_pose_2d_min_message)
+            assert [msg.x for msg in received] == [1, 3, 5]
+            assert shm_reader.lag == 0
+            assert shm_reader.stats["frames_read"] == 6
+            assert shm_reader.read() == []
+            assert not shm_reader.wait(timeout=0.01)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+msgs = pytest.importorskip("hippolink.msgs")
+from hippolink.state import StateCache  # noqa: E402
+
+
+def start_waiter(cache, *args):
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(cache.wait(*args, timeout=5.0)))
+    thread.start()
+    # wait() has read the version and is blocked on the condition
+    deadline = time.monotonic() + 5.0
+    while not cache._updated._waiters and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return thread, result
+
+
+def test_entries_per_node_and_latest_of_any_node():
+    cache = StateCache(clock=lambda: 10.0)
+    first = msgs.HippoLink_pose_2d_min_message(1, 2, 3)
+    first.pack_into(bytearray(msgs.MAX_FRAME_LEN), 0, 4)
+    second = msgs.HippoLink_pose_2d_min_message(4, 5, 6)
+    second.pack_into(bytearray(msgs.MAX_FRAME_LEN), 0, 7)
+    cache.update(first)
+    cache.update(second, timestamp=9.0)
+    msg_type = msgs.HippoLink_pose_2d_min_message
+    assert cache.get(msg_type, 4) is first
+    assert cache.get(msg_type.id, 7) is second
+    assert cache.get(msg_type) is second
+    assert cache.entry(msg_type) == (second, 9.0, 2)
+    assert cache.age(msg_type, 4) == 0.0
+    assert cache.is_stale(msg_type, 0.5, 7)
+    assert sorted(cache.keys()) == [(4, msg_type.id), (7, msg_type.id)]
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get(msg_type) is None
+
+
+def test_wait_returns_next_update():
+    cache = StateCache()
+    msg = msgs.HippoLink_pose_2d_min_message(1, 2, 3)
+    thread, result = start_waiter(cache, msg.id)
+    cache.update(msg)
+    thread.join()
+    assert result == [msg]
+    assert cache.wait(msg.id, timeout=0.01) is None
+
+
+def test_wait_sees_update_after_clear():
+    cache = StateCache()
+    old = msgs.HippoLink_pose_2d_min_message(1, 2, 3)
+    new = msgs.HippoLink_pose_2d_min_message(4, 5, 6)
+    cache.update(old)
+    thread, result = start_waiter(cache, old.id)
+    # the new entry has the same update count as the one wait started with
+    cache.clear()
+    cache.update(new)
+    thread.join()
+    assert result == [new]